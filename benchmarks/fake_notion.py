@@ -0,0 +1,411 @@
+"""A local stand-in for the Notion API, for measuring and testing materialization offline.
+
+``FakeNotion`` keeps pages, databases and blocks in memory and serves them over HTTP on localhost, so the regular
+clients can talk to it by passing its ``url`` as ``base_url``. It implements the endpoints the materializer and
+exporter use, enforces Notion's payload limits, and can add latency and answer with 429s to exercise retries::
+
+    with FakeNotion(latency=0.05, throttle=0.02) as server:
+        root = server.add_page("Root")
+        client = RateLimitedAsyncClient(auth="fake", base_url=server.url)
+
+Run ``python -m benchmarks.fake_notion`` to serve it on a fixed port for manual testing.
+"""
+import argparse
+import copy
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+MAX_CHILDREN_PER_REQUEST = 100
+MAX_BLOCKS_PER_REQUEST = 1000
+MAX_NESTING_DEPTH = 2
+MAX_TEXT_LENGTH = 2000
+MAX_RICH_TEXT_ITEMS = 100
+MAX_PAGE_SIZE = 100
+MAX_PAYLOAD_BYTES = 500 * 1000
+
+ANNOTATIONS = {"bold": False, "italic": False, "strikethrough": False, "underline": False, "code": False,
+               "color": "default"}
+ID_PATTERN = re.compile(r"[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}")
+
+
+class APIError(Exception):
+    def __init__(self, status, code, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.headers = headers or {}
+
+
+def now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def normalize_id(block_id):
+    block_id = block_id.replace("-", "")
+    return f"{block_id[:8]}-{block_id[8:12]}-{block_id[12:16]}-{block_id[16:20]}-{block_id[20:]}"
+
+
+def rich_text(items):
+    if len(items) > MAX_RICH_TEXT_ITEMS:
+        raise APIError(400, "validation_error", f"rich_text should have at most {MAX_RICH_TEXT_ITEMS} items")
+    result = []
+    for item in items:
+        content = item.get("text", {}).get("content", "")
+        if len(content) > MAX_TEXT_LENGTH:
+            raise APIError(400, "validation_error", f"text.content length should be at most {MAX_TEXT_LENGTH}")
+        result.append({"type": "text", "text": {"content": content, "link": item.get("text", {}).get("link")},
+                       "annotations": {**ANNOTATIONS, **item.get("annotations", {})}, "plain_text": content,
+                       "href": None})
+    return result
+
+
+def count_blocks(children, depth=0):
+    """Checks the children of a request against Notion's limits, and returns how many blocks they hold."""
+    if len(children) > MAX_CHILDREN_PER_REQUEST:
+        raise APIError(400, "validation_error", f"children should have at most {MAX_CHILDREN_PER_REQUEST} items")
+    total = 0
+    for child in children:
+        if child.get("type") in ("child_page", "child_database"):
+            raise APIError(400, "validation_error", f"{child['type']} blocks are created through their own endpoint")
+        body = child.get(child.get("type"), {})
+        for key in ("rich_text", "caption"):
+            rich_text(body.get(key, []))
+        nested = body.get("children") or []
+        if child.get("type") == "column" and not nested:
+            raise APIError(400, "validation_error", "columns should have at least one child")
+        if nested and depth >= MAX_NESTING_DEPTH:
+            raise APIError(400, "validation_error", f"blocks can be nested at most {MAX_NESTING_DEPTH} levels deep")
+        total += 1 + count_blocks(nested, depth + 1)
+    return total
+
+
+class FakeNotion:
+    """In-memory Notion workspace served over HTTP on localhost.
+
+    ``latency`` (plus up to ``jitter``) seconds are added to every request. With ``throttle``, that fraction of
+    requests is answered with a 429 and a ``Retry-After`` of ``retry_after`` seconds, and with ``rate``, so is every
+    request beyond that many per second, as the real API does. ``requests`` counts the requests served by endpoint.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, throttle=0.0, rate=None, retry_after=1, seed=0, port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle = throttle
+        self.rate = rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.pages = {}
+        self.databases = {}
+        self.blocks = {}
+        self.children = {}
+        self.requests = Counter()
+        self.throttled = 0
+        self.allowance = rate
+        self.checked = time.monotonic()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests.clear()
+            self.throttled = 0
+
+    def add_page(self, title="Untitled", parent_id=None):
+        """Creates a page to build under. Without a ``parent_id`` it sits at the top of the workspace."""
+        with self.lock:
+            return self.create_page({"page_id": parent_id} if parent_id else {"workspace": True}, title, None, None)["id"]
+
+    def handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in one write, which keeps delayed ACKs from adding 40 ms to every request.
+            wbufsize = 64 * 1024
+            disable_nagle_algorithm = True
+
+            def handle_request(self):
+                url = urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                status, payload, headers = server.respond(self.command, url.path, parse_qs(url.query), raw)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = handle_request
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def respond(self, method, path, query, raw):
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        endpoint = f"{method} {ID_PATTERN.sub('{id}', path)}"
+        try:
+            with self.lock:
+                self.requests[endpoint] += 1
+                self.check_rate()
+                if len(raw) > MAX_PAYLOAD_BYTES:
+                    raise APIError(413, "payload_too_large", f"request bodies should be at most {MAX_PAYLOAD_BYTES} bytes")
+                body = json.loads(raw) if raw else {}
+                return 200, self.route(method, path, query, body), {}
+        except APIError as e:
+            return e.status, {"object": "error", "status": e.status, "code": e.code, "message": str(e)}, e.headers
+        except (KeyError, TypeError, ValueError) as e:
+            return 400, {"object": "error", "status": 400, "code": "validation_error", "message": repr(e)}, {}
+
+    def check_rate(self):
+        throttled = self.throttle and self.random.random() < self.throttle
+        if self.rate is not None:
+            current = time.monotonic()
+            self.allowance = min(self.rate, self.allowance + (current - self.checked) * self.rate)
+            self.checked = current
+            if self.allowance < 1:
+                throttled = True
+            else:
+                self.allowance -= 1
+        if throttled:
+            self.throttled += 1
+            raise APIError(429, "rate_limited", "You have been rate limited.", {"Retry-After": str(self.retry_after)})
+
+    def route(self, method, path, query, body):
+        parts = path.strip("/").split("/")[1:]
+        if parts[0] not in ("pages", "databases", "blocks"):
+            raise APIError(400, "invalid_request_url", f"Invalid request URL: {path}")
+        if len(parts) == 1 and method == "POST":
+            return self.create_from(parts[0], body)
+        block_id = normalize_id(parts[1])
+
+        if parts[0] == "pages":
+            page = self.find(self.pages, block_id)
+            if method == "PATCH":
+                self.update_page(page, body)
+            return page
+        if parts[0] == "databases" and method == "GET":
+            return self.find(self.databases, block_id)
+        if parts[0] == "blocks" and parts[2:] == ["children"]:
+            self.find(self.blocks, block_id)
+            if method == "PATCH":
+                return self.append(block_id, body)
+            return self.list(block_id, query)
+        if parts[0] == "blocks" and len(parts) == 2:
+            block = self.find(self.blocks, block_id)
+            if method == "DELETE":
+                self.archive(block_id)
+            elif method == "PATCH":
+                self.update_block(block, body)
+            return self.block_object(block_id)
+        raise APIError(400, "invalid_request_url", f"Invalid request URL: {method} {path}")
+
+    def find(self, objects, block_id):
+        if block_id not in objects or (objects[block_id].get("archived") and objects is not self.pages):
+            raise APIError(404, "object_not_found", f"Could not find block with ID: {block_id}.")
+        return objects[block_id]
+
+    def create_from(self, kind, body):
+        parent = body.get("parent", {})
+        parent_id = normalize_id(parent.get("page_id") or "")
+        self.find(self.pages, parent_id)
+        if kind == "pages":
+            title = body["properties"]["title"]["title"]
+            page = self.create_page({"page_id": parent_id}, title, body.get("icon"), body.get("cover"))
+            if body.get("children"):
+                self.append(page["id"], {"children": body["children"]})
+            return page
+        if kind == "databases":
+            return self.create_database(parent_id, body)
+        raise APIError(400, "invalid_request_url", "Invalid request URL.")
+
+    def create_page(self, parent, title, icon, cover):
+        page_id = str(uuid.UUID(int=self.random.getrandbits(128)))
+        title = rich_text(title) if isinstance(title, list) else rich_text([{"text": {"content": title}}])
+        self.pages[page_id] = {
+            "object": "page", "id": page_id, "created_time": now(), "last_edited_time": now(), "archived": False,
+            "icon": {"type": "emoji", **icon} if icon else None, "cover": cover, "parent": parent,
+            "properties": {"title": {"id": "title", "type": "title", "title": title}},
+        }
+        self.blocks[page_id] = {"type": "child_page", "child_page": {"title": "".join(t["plain_text"] for t in title)}}
+        self.children[page_id] = []
+        if "page_id" in parent:
+            self.attach(parent["page_id"], page_id, None)
+        return self.pages[page_id]
+
+    def create_database(self, parent_id, body):
+        database_id = str(uuid.UUID(int=self.random.getrandbits(128)))
+        properties = {}
+        for name, config in body.get("properties", {}).items():
+            prop_type = next(iter(config))
+            details = copy.deepcopy(config[prop_type])
+            for option in details.get("options", []):
+                option.setdefault("color", "default")
+            properties[name] = {"id": uuid.uuid4().hex[:4], "name": name, "type": prop_type, prop_type: details}
+        if sum(prop["type"] == "title" for prop in properties.values()) != 1:
+            raise APIError(400, "validation_error", "databases need exactly one title property")
+        title = rich_text(body.get("title", []))
+        self.databases[database_id] = {
+            "object": "database", "id": database_id, "created_time": now(), "last_edited_time": now(),
+            "title": title, "icon": {"type": "emoji", **body["icon"]} if body.get("icon") else None,
+            "cover": body.get("cover"), "is_inline": body.get("is_inline", False), "properties": properties,
+            "parent": {"type": "page_id", "page_id": parent_id}, "archived": False,
+        }
+        self.blocks[database_id] = {"type": "child_database",
+                                    "child_database": {"title": "".join(t["plain_text"] for t in title)}}
+        self.attach(parent_id, database_id, None)
+        return self.databases[database_id]
+
+    def update_page(self, page, body):
+        if "properties" in body and "title" in body["properties"]:
+            page["properties"]["title"]["title"] = rich_text(body["properties"]["title"]["title"])
+            self.blocks[page["id"]]["child_page"]["title"] = "".join(
+                t["plain_text"] for t in page["properties"]["title"]["title"])
+        if "icon" in body:
+            page["icon"] = {"type": "emoji", **body["icon"]} if body["icon"] else None
+        if "archived" in body:
+            page["archived"] = body["archived"]
+        page["last_edited_time"] = now()
+
+    def update_block(self, block, body):
+        content = body.get(block["type"])
+        if content is None:
+            raise APIError(400, "validation_error", f"body should include {block['type']}")
+        if "rich_text" in content:
+            content = dict(content, rich_text=rich_text(content["rich_text"]))
+        block[block["type"]].update(content)
+        block["last_edited_time"] = now()
+
+    def append(self, parent_id, body):
+        children = body.get("children") or []
+        if not children:
+            raise APIError(400, "validation_error", "body.children should be defined")
+        if count_blocks(children) > MAX_BLOCKS_PER_REQUEST:
+            raise APIError(400, "validation_error", f"requests should hold at most {MAX_BLOCKS_PER_REQUEST} blocks")
+        after = normalize_id(body["after"]) if body.get("after") else None
+        if after is not None and after not in self.children[parent_id]:
+            raise APIError(400, "validation_error", f"Block {after} is not a child of {parent_id}.")
+        created = []
+        for child in children:
+            created.append(self.add_block(parent_id, child, after))
+            after = created[-1] if after is not None else None
+        return {"object": "list", "results": [self.block_object(block_id) for block_id in created], "next_cursor": None,
+                "has_more": False, "type": "block", "block": {}}
+
+    def add_block(self, parent_id, payload, after):
+        block_type = payload["type"]
+        block_id = str(uuid.UUID(int=self.random.getrandbits(128)))
+        content = copy.deepcopy(payload.get(block_type, {}))
+        nested = content.pop("children", None) or []
+        for key in ("rich_text", "caption"):
+            if key in content:
+                content[key] = rich_text(content[key])
+        self.blocks[block_id] = {"type": block_type, block_type: content, "created_time": now(),
+                                 "last_edited_time": now()}
+        self.children[block_id] = []
+        self.attach(parent_id, block_id, after)
+        for child in nested:
+            self.add_block(block_id, child, None)
+        return block_id
+
+    def attach(self, parent_id, block_id, after):
+        siblings = self.children[parent_id]
+        siblings.insert(siblings.index(after) + 1 if after is not None else len(siblings), block_id)
+        self.blocks[block_id]["parent"] = parent_id
+        self.touch(parent_id)
+
+    def touch(self, block_id):
+        # Edits move the time of the block and of the page it is on, like they do in Notion.
+        while block_id is not None:
+            if block_id in self.pages:
+                self.pages[block_id]["last_edited_time"] = now()
+                return
+            self.blocks[block_id]["last_edited_time"] = now()
+            block_id = self.blocks[block_id].get("parent")
+
+    def archive(self, block_id):
+        self.blocks[block_id]["archived"] = True
+        self.children[self.blocks[block_id]["parent"]].remove(block_id)
+        for objects in (self.pages, self.databases):
+            if block_id in objects:
+                objects[block_id]["archived"] = True
+        self.touch(self.blocks[block_id]["parent"])
+
+    def block_object(self, block_id):
+        block = self.blocks[block_id]
+        parent_id = block.get("parent")
+        parent = {"type": "page_id", "page_id": parent_id} if parent_id in self.pages else \
+            {"type": "block_id", "block_id": parent_id}
+        # A subpage's block is the page itself, so it is listed with the page's edit time.
+        edited = self.pages[block_id]["last_edited_time"] if block_id in self.pages else block.get("last_edited_time", now())
+        return {
+            "object": "block", "id": block_id, "parent": parent, "type": block["type"],
+            block["type"]: block[block["type"]], "has_children": bool(self.children.get(block_id)),
+            "archived": block.get("archived", False), "created_time": block.get("created_time", now()),
+            "last_edited_time": edited,
+        }
+
+    def list(self, block_id, query):
+        page_size = min(int(query.get("page_size", [MAX_PAGE_SIZE])[0]), MAX_PAGE_SIZE)
+        start = int(query.get("start_cursor", ["0"])[0])
+        children = self.children[block_id]
+        end = start + page_size
+        return {"object": "list", "results": [self.block_object(child) for child in children[start:end]],
+                "next_cursor": str(end) if end < len(children) else None, "has_more": end < len(children),
+                "type": "block", "block": {}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Notion API.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--throttle", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--rate", type=float, help="Requests per second served before answering with 429s")
+    args = parser.parse_args()
+
+    server = FakeNotion(args.latency, throttle=args.throttle, rate=args.rate, port=args.port)
+    root = server.add_page("Root")
+    print(f"Serving on {server.url}, pass it as base_url. Root page: {root}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
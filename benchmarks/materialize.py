@@ -0,0 +1,98 @@
+"""Benchmark materializing blueprints against a local stand-in for the Notion API.
+
+Run from the repository root with ``python -m benchmarks.materialize``. Every blueprint in
+``data/example_blueprints.csv`` is written to a ``FakeNotion`` server ``--repeat`` times, and the requests, 429s and
+wall times of each are reported along with their p50/p95. Covers are left out so Unsplash is never called, and the
+process-wide rate limit is raised to ``--rate`` so the numbers reflect the materializer rather than the limiter.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import math
+import os
+import time
+
+# The clients only talk to the local server, but the modules read their keys on import.
+os.environ.setdefault("NOTION_KEY", "benchmark")
+os.environ.setdefault("UNSPLASH_ACCESS_KEY", "benchmark")
+
+from benchmarks.fake_notion import FakeNotion
+from blueprints.materializer import MAX_CONCURRENCY, Materializer, collect_titles
+from blueprints.ratelimit import RateLimitedAsyncClient, limiter
+
+
+def load_blueprints(path):
+    with open(path, encoding="utf-8-sig") as file:
+        return [json.loads(row["Blueprint"]) for row in csv.DictReader(file)]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+async def materialize(server, blueprint, max_concurrency):
+    root = server.add_page("Benchmark")
+    covers = {title: None for title in collect_titles(blueprint)}
+    async with RateLimitedAsyncClient(auth="benchmark", base_url=server.url) as notion:
+        await Materializer(notion, max_concurrency, seed=0, covers=covers).run(root, blueprint)
+
+
+def bench_blueprint(server, blueprint, repeat, max_concurrency):
+    requests, throttled, times = [], [], []
+    for _ in range(repeat):
+        server.reset_stats()
+        start = time.perf_counter()
+        asyncio.run(materialize(server, blueprint, max_concurrency))
+        times.append(time.perf_counter() - start)
+        requests.append(sum(server.requests.values()))
+        throttled.append(server.throttled)
+    return {"title": blueprint.get("title", "Untitled"), "requests": requests, "throttled": throttled, "times": times,
+            "endpoints": dict(server.requests)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark materializing blueprints against a local Notion stand-in.")
+    parser.add_argument("--csv", default="data/example_blueprints.csv", help="Blueprints to materialize")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of times each blueprint is materialized")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the server takes for every request")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Up to this many seconds added to the latency")
+    parser.add_argument("--throttle", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After of the injected 429s, in seconds")
+    parser.add_argument("--rate", type=float, default=1000, help="Client-side requests per second (Notion allows 3)")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY, help="Requests in flight per page")
+    args = parser.parse_args()
+
+    limiter.rate = args.rate
+    limiter.burst = max(1, int(args.rate))
+
+    blueprints = load_blueprints(args.csv)
+    with FakeNotion(args.latency, args.jitter, args.throttle, retry_after=args.retry_after) as server:
+        results = [bench_blueprint(server, blueprint, args.repeat, args.max_concurrency) for blueprint in blueprints]
+
+    print(f"{'blueprint':<40} {'requests':>8} {'429s':>5} {'p50 ms':>8} {'p95 ms':>8}")
+    for result in results:
+        print(f"{result['title'][:40]:<40} {percentile(result['requests'], 0.5):>8} {sum(result['throttled']):>5} "
+              f"{percentile(result['times'], 0.5) * 1e3:>8.0f} {percentile(result['times'], 0.95) * 1e3:>8.0f}")
+
+    times = [duration for result in results for duration in result["times"]]
+    requests = [count for result in results for count in result["requests"]]
+    endpoints = {}
+    for result in results:
+        for endpoint, count in result["endpoints"].items():
+            endpoints[endpoint] = endpoints.get(endpoint, 0) + count
+    print()
+    print(f"blueprints:          {len(blueprints)} x {args.repeat}")
+    print(f"requests:            {sum(requests) / args.repeat:.0f} per pass, p50 {percentile(requests, 0.5)} / "
+          f"p95 {percentile(requests, 0.95)} per blueprint")
+    print(f"wall time:           {sum(times) / args.repeat:.2f}s per pass, p50 {percentile(times, 0.5) * 1e3:.0f} ms / "
+          f"p95 {percentile(times, 0.95) * 1e3:.0f} ms per blueprint")
+    print(f"429s retried:        {sum(sum(result['throttled']) for result in results)}")
+    print("requests by endpoint, per pass:")
+    for endpoint, count in sorted(endpoints.items(), key=lambda item: -item[1]):
+        print(f"  {endpoint:<35} {count}")
+
+
+if __name__ == "__main__":
+    main()
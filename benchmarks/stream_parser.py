@@ -0,0 +1,96 @@
+"""Benchmark the incremental blueprint parser over recorded completion streams.
+
+Run from the repository root with ``python -m benchmarks.stream_parser``. Without ``--recordings`` the streams are
+synthesized from ``data/example_blueprints.csv`` by splitting each example response into token-sized chunks, the
+way the OpenAI API streams them.
+"""
+import argparse
+import csv
+import json
+import random
+import statistics
+import time
+
+import json_repair
+
+from blueprints.jsonstream import BlueprintStreamParser, ChildCompleted
+
+
+def synthesize_recordings(path, seed=0):
+    rng = random.Random(seed)
+    recordings = []
+    with open(path, encoding="utf-8-sig") as file:
+        for row in csv.DictReader(file):
+            text = json.dumps({"response": row["Response"], "blueprint": json.loads(row["Blueprint"])},
+                              ensure_ascii=False, separators=(",", ":"))
+            chunks = []
+            position = 0
+            while position < len(text):
+                size = rng.randint(1, 8)
+                chunks.append(text[position:position + size])
+                position += size
+            recordings.append(chunks)
+    return recordings
+
+
+def load_recordings(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def bench_stream(chunks):
+    parser = BlueprintStreamParser()
+    chunk_times = []
+    first_child = None
+    start = time.perf_counter()
+    for index, chunk in enumerate(chunks):
+        chunk_start = time.perf_counter()
+        events = parser.feed(chunk)
+        chunk_times.append(time.perf_counter() - chunk_start)
+        if first_child is None and any(isinstance(event, ChildCompleted) for event in events):
+            first_child = (index + 1) / len(chunks)
+    parser.finish()
+    total = time.perf_counter() - start
+
+    text = "".join(chunks)
+    start = time.perf_counter()
+    json_repair.loads(text)
+    repair = time.perf_counter() - start
+
+    return {
+        "chars": len(text),
+        "chunks": len(chunks),
+        "parse": total,
+        "max_chunk": max(chunk_times),
+        "json_repair": repair,
+        "first_child": first_child,
+        "failed": parser.failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the incremental blueprint parser.")
+    parser.add_argument("--recordings", help="JSONL file with one JSON array of streamed chunks per line")
+    parser.add_argument("--csv", default="data/example_blueprints.csv", help="Examples to synthesize streams from")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of passes over the recordings")
+    args = parser.parse_args()
+
+    recordings = load_recordings(args.recordings) if args.recordings else synthesize_recordings(args.csv)
+
+    results = [bench_stream(chunks) for _ in range(args.repeat) for chunks in recordings]
+    chars = sum(result["chars"] for result in results)
+    parse = sum(result["parse"] for result in results)
+    repair = sum(result["json_repair"] for result in results)
+    first_child = [result["first_child"] for result in results if result["first_child"] is not None]
+
+    print(f"streams:                 {len(recordings)} x {args.repeat}")
+    print(f"incremental parser:      {chars / parse / 1e6:.2f} MB/s, {parse / len(results) * 1e3:.2f} ms per stream")
+    print(f"slowest single chunk:    {max(result['max_chunk'] for result in results) * 1e6:.1f} us")
+    print(f"json_repair, full text:  {chars / repair / 1e6:.2f} MB/s, {repair / len(results) * 1e3:.2f} ms per stream")
+    if first_child:
+        print(f"first child available:   after {statistics.median(first_child):.0%} of the stream (median)")
+    print(f"streams needing fallback: {sum(result['failed'] for result in results)}")
+
+
+if __name__ == "__main__":
+    main()
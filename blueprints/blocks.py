@@ -1,27 +1,6 @@
-import os
-
-import requests
-from notion_client import Client
-
-NOTION_KEY = os.environ["NOTION_KEY"]
-UNSPLASH_ACCESS_KEY = os.environ["UNSPLASH_ACCESS_KEY"]
-
-notion = Client(auth=NOTION_KEY)
-
-
-def get_unsplash_image_url(query):
-    params = {
-        "query": query,
-        "client_id": UNSPLASH_ACCESS_KEY,
-        "orientation": "landscape"
-    }
-    response = requests.get("https://api.unsplash.com/search/photos", params=params)
-
-    if response.status_code == 200:
-        results = response.json()["results"]
-        if results:
-            return results[0]["urls"]["regular"]
-    return None
+MAX_CHILDREN_PER_REQUEST = 100
+MAX_BLOCKS_PER_REQUEST = 1000
+MAX_NESTING_DEPTH = 2
 
 
 def process_rich_text_content(text_blocks):
@@ -46,9 +25,7 @@ def process_rich_text_content(text_blocks):
     return rich_text_content
 
 
-def create_page(parent_id, title, icon, cover_image=True):
-    image_url = get_unsplash_image_url(title) if cover_image else None
-
+def page_payload(parent_id, title, icon, image_url=None):
     page_payload = {
         "parent": {
             "page_id": parent_id
@@ -76,13 +53,10 @@ def create_page(parent_id, title, icon, cover_image=True):
                 "url": image_url
             }
         }
-
-    new_page = notion.pages.create(**page_payload)
-    return new_page
+    return page_payload
 
 
-def create_database(parent_id, title, icon, schema, is_inline=False, cover_image=True):
-    image_url = get_unsplash_image_url(title) if cover_image else None
+def database_payload(parent_id, title, icon, schema, is_inline=False, image_url=None):
     approved_types = ("checkbox", "created_by", "created_time", "date", "email", "files", "last_edited_by",
                       "last_edited_time", "multi_select", "number", "people", "phone_number", "rich_text", "select",
                       "title", "url")
@@ -126,81 +100,55 @@ def create_database(parent_id, title, icon, schema, is_inline=False, cover_image
                 "url": image_url
             }
         }
+    return database_payload
 
-    new_database = notion.databases.create(**database_payload)
-    return new_database
 
-
-def create_divider(parent_id):
-    divider_block = notion.blocks.children.append(**{
-        "block_id": parent_id,
-        "children": [
-            {
-                "object": "block",
-                "type": "divider",
-                "divider": {},
-            }
-        ]
-    })
-    return divider_block
+def divider_block():
+    return {
+        "object": "block",
+        "type": "divider",
+        "divider": {},
+    }
 
 
-def create_table_of_contents(parent_id):
-    toc_block = notion.blocks.children.append(**{
-        "block_id": parent_id,
-        "children": [
-            {
-                "object": "block",
-                "type": "table_of_contents",
-                "table_of_contents": {}
-            }
-        ]
-    })
-    return toc_block
+def table_of_contents_block():
+    return {
+        "object": "block",
+        "type": "table_of_contents",
+        "table_of_contents": {}
+    }
 
 
-def create_heading(parent_id, text, level):
-    heading_block = notion.blocks.children.append(**{
-        "block_id": parent_id,
-        "children": [
-            {
-                "object": "block",
-                "type": f"heading_{level}",
-                f"heading_{level}": {
-                    "rich_text": [
-                        {
-                            "type": "text",
-                            "text": {
-                                "content": text
-                            }
-                        }
-                    ],
-                },
-            }
-        ]
-    })
-    return heading_block
+def heading_block(text, level):
+    return {
+        "object": "block",
+        "type": f"heading_{level}",
+        f"heading_{level}": {
+            "rich_text": [
+                {
+                    "type": "text",
+                    "text": {
+                        "content": text
+                    }
+                }
+            ],
+        },
+    }
 
 
-def create_paragraph(parent_id, text_blocks):
-    paragraph_block = notion.blocks.children.append(**{
-        "block_id": parent_id,
-        "children": [
-            {
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": process_rich_text_content(text_blocks)
-                }
-            }
-        ]
-    })
-    return paragraph_block
+def paragraph_block(text_blocks):
+    return {
+        "object": "block",
+        "type": "paragraph",
+        "paragraph": {
+            "rich_text": process_rich_text_content(text_blocks)
+        }
+    }
 
 
-def create_list(parent_id, items, bulleted=True):
+def list_blocks(items, bulleted=True):
     list_type = "bulleted_list_item" if bulleted else "numbered_list_item"
-    children = [{
+    return [{
         "object": "block",
         "type": list_type,
         list_type: {
@@ -215,15 +163,9 @@ def create_list(parent_id, items, bulleted=True):
         }
     } for item in items]
 
-    list_block = notion.blocks.children.append(**{
-        "block_id": parent_id,
-        "children": children
-    })
-    return list_block
 
-
-def create_todo_list(parent_id, items):
-    children = [{
+def todo_list_blocks(items):
+    return [{
         "object": "block",
         "type": "to_do",
         "to_do": {
@@ -239,118 +181,64 @@ def create_todo_list(parent_id, items):
         },
     } for item in items]
 
-    todo_block = notion.blocks.children.append(**{
-        "block_id": parent_id,
-        "children": children
-    })
-    return todo_block
-
 
-def create_toggle(parent_id, title):
-    toggle_block = notion.blocks.children.append(**{
-        "block_id": parent_id,
-        "children": [
-            {
-                "object": "block",
-                "type": "toggle",
-                "toggle": {
-                    "rich_text": [
-                        {
-                            "type": "text",
-                            "text": {
-                                "content": title
-                            }
-                        }
-                    ],
+def toggle_block(title):
+    return {
+        "object": "block",
+        "type": "toggle",
+        "toggle": {
+            "rich_text": [
+                {
+                    "type": "text",
+                    "text": {
+                        "content": title
+                    }
                 }
-            }
-        ]
-    })
-    return toggle_block
+            ],
+        }
+    }
 
 
-def create_column_list(parent_id, num_columns=2):
-    column_list_block = notion.blocks.children.append(**{
-        "block_id": parent_id,
-        "children": [
-            {
-                "object": "block",
-                "type": "column_list",
-                "column_list": {
-                    "children": [
-                        {
-                            "object": "block",
-                            "type": "column",
-                            "column": {
-                                "children": [
-                                    {
-                                        "object": "block",
-                                        "type": "paragraph",
-                                        "paragraph": {
-                                            "rich_text": [
-                                                {
-                                                    "type": "text",
-                                                    "text": {
-                                                        "content": "placeholder",
-                                                    }
-                                                }
-                                            ]
-                                        }
-                                    }
-                                ]
-                            }
-                        } for _ in range(num_columns)
-                    ]
-                }
-            }
-        ]
-    })
-
-    column_details = notion.blocks.children.list(block_id=column_list_block["results"][0]["id"])
-    column_ids = []
+def callout_block(text_blocks, icon, color="default"):
+    return {
+        "object": "block",
+        "type": "callout",
+        "callout": {
+            "rich_text": process_rich_text_content(text_blocks),
+            "icon": {
+                "type": "emoji",
+                "emoji": icon
+            },
+            "color": color
+        }
+    }
 
-    for column in column_details["results"]:
-        column_ids.append(column["id"])
-        children_details = notion.blocks.children.list(block_id=column["id"])
-        for child in children_details["results"]:
-            if "paragraph" in child and child["paragraph"]["rich_text"][0]["text"]["content"] == "placeholder":
-                notion.blocks.delete(child["id"])
 
-    return column_ids
+def quote_block(text_blocks):
+    return {
+        "object": "block",
+        "type": "quote",
+        "quote": {
+            "rich_text": process_rich_text_content(text_blocks)
+        }
+    }
 
 
-def create_callout(parent_id, text_blocks, icon, color="default"):
-    callout_block = notion.blocks.children.append(**{
-        "block_id": parent_id,
-        "children": [
-            {
-                "object": "block",
-                "type": "callout",
-                "callout": {
-                    "rich_text": process_rich_text_content(text_blocks),
-                    "icon": {
-                        "type": "emoji",
-                        "emoji": icon
-                    },
-                    "color": color
-                }
-            }
-        ]
-    })
-    return callout_block
+def column_block(children):
+    return {
+        "object": "block",
+        "type": "column",
+        "column": {
+            "children": children
+        }
+    }
 
 
-def create_quote(parent_id, text_blocks):
-    quote_block = notion.blocks.children.append(**{
-        "block_id": parent_id,
-        "children": [
-            {
-                "object": "block",
-                "type": "quote",
-                "quote": {
-                    "rich_text": process_rich_text_content(text_blocks)
-                }
-            }
-        ]
-    })
-    return quote_block
+def column_list_block(columns):
+    return {
+        "object": "block",
+        "type": "column_list",
+        "column_list": {
+            "children": columns
+        }
+    }
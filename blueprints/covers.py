@@ -0,0 +1,68 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+from .diskcache import DiskCache, MISSING, cache_path
+
+UNSPLASH_ACCESS_KEY = os.environ["UNSPLASH_ACCESS_KEY"]
+UNSPLASH_TIMEOUT = 5
+COVER_CACHE_TTL = 30 * 24 * 60 * 60
+COVER_CACHE_SIZE = 5000
+PREFETCH_WORKERS = 8
+
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=PREFETCH_WORKERS))
+
+cover_cache = DiskCache(cache_path("covers.sqlite3"), ttl=COVER_CACHE_TTL, max_entries=COVER_CACHE_SIZE)
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+def search_unsplash(query):
+    params = {
+        "query": query,
+        "client_id": UNSPLASH_ACCESS_KEY,
+        "orientation": "landscape"
+    }
+    with metrics.measure("unsplash", "GET /search/photos") as call:
+        response = session.get("https://api.unsplash.com/search/photos", params=params, timeout=UNSPLASH_TIMEOUT)
+        call.status, call.received = response.status_code, len(response.content)
+        response.raise_for_status()
+
+    results = response.json()["results"]
+    if results:
+        return results[0]["urls"]["regular"]
+    return None
+
+
+def get_unsplash_image_url(query):
+    key = normalize_query(query)
+    image_url = cover_cache.get(key, MISSING)
+    if image_url is not MISSING:
+        return image_url
+
+    try:
+        image_url = search_unsplash(key)
+    except requests.RequestException:
+        # A cover is optional, so failures are neither fatal nor cached.
+        return None
+
+    # Empty searches are cached too, they cost the same quota to repeat.
+    cover_cache.set(key, image_url)
+    return image_url
+
+
+def prefetch_covers(titles, max_workers=PREFETCH_WORKERS):
+    queries = {}
+    for title in titles:
+        queries.setdefault(normalize_query(title), []).append(title)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        image_urls = dict(zip(queries, executor.map(metrics.carry(get_unsplash_image_url), queries)))
+
+    return {title: image_urls[query] for query, same_titles in queries.items() for title in same_titles}
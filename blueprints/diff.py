@@ -0,0 +1,244 @@
+import difflib
+import json
+from collections import Counter
+from typing import NamedTuple, Optional
+
+from .blocks import MAX_BLOCKS_PER_REQUEST, MAX_CHILDREN_PER_REQUEST, database_payload
+from .materializer import MAX_CONCURRENCY, NOTION_KEY, UNBATCHED_TYPES, Materializer, compile_block
+from .ratelimit import RateLimitedAsyncClient
+from .utils import export_page
+
+# Blocks whose content blocks.update can change, as long as the type stays the same.
+UPDATABLE_TYPES = ("paragraph", "heading_1", "heading_2", "heading_3", "bulleted_list_item", "numbered_list_item",
+                   "to_do", "toggle", "callout", "quote")
+CONTAINER_TYPES = ("toggle", "callout", "quote")
+
+
+class Unit(NamedTuple):
+    """A single Notion block of a blueprint level. Each list item is a unit of its own."""
+    kind: str
+    key: str
+    node: dict
+    payload: Optional[dict]
+    deferred: list
+    size: int
+    block_id: Optional[str]
+
+
+def block_key(payload):
+    body = {key: value for key, value in payload[payload["type"]].items() if key != "children"}
+    if payload["type"] == "column_list":
+        body = {"columns": len(payload["column_list"]["children"])}
+    return json.dumps([payload["type"], body], sort_keys=True, ensure_ascii=False)
+
+
+def units(children):
+    result = []
+    for node in children:
+        if node["type"] in UNBATCHED_TYPES:
+            key = json.dumps([node["type"], node.get("title")], ensure_ascii=False)
+            result.append(Unit(node["type"], key, node, None, [], 0, node.get("id")))
+            continue
+
+        payloads, deferred, size = compile_block(node)
+        block_ids = node.get("ids") or [node.get("id")] * len(payloads)
+        for index, payload in enumerate(payloads):
+            # Only single-block nodes have children, so everything deferred hangs off the first payload.
+            result.append(Unit(payload["type"], block_key(payload), node, payload, deferred if index == 0 else [],
+                               size if len(payloads) == 1 else 1, block_ids[index]))
+    return result
+
+
+def schema_signature(schema):
+    return {
+        name: (prop["type"], [option["name"] for option in prop.get("options", [])], prop.get("format"))
+        for name, prop in schema.items()
+    }
+
+
+def title_property(schema):
+    return next((name for name, prop in schema.items() if prop["type"] == "title"), None)
+
+
+def schema_update(old_schema, new_schema):
+    """The ``properties`` of a databases.update that turns ``old_schema`` into ``new_schema``, or ``None``."""
+    if schema_signature(old_schema) == schema_signature(new_schema):
+        return None
+    properties = database_payload(None, "", None, new_schema)["properties"]
+    old_title, new_title = title_property(old_schema), title_property(new_schema)
+    if old_title != new_title and old_title is not None and new_title is not None:
+        # Every database has exactly one title property, so it is renamed rather than replaced.
+        properties[old_title] = {"name": new_title}
+        del properties[new_title]
+    for name in old_schema:
+        if name not in new_schema and name != old_title:
+            properties[name] = None
+    return properties
+
+
+def align(old, new):
+    """Lines up the units of two versions of a level.
+
+    Returns the new units in order, each with the old unit it reuses (``None`` for a new block), and the old units
+    to delete. Units with the same type and content are kept, and within a changed stretch a block whose type did not
+    change is updated in place, as are subpages and databases, which cannot be recreated without losing what is in
+    them.
+    """
+    matcher = difflib.SequenceMatcher(None, [unit.key for unit in old], [unit.key for unit in new], autojunk=False)
+    placed = []
+    deleted = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            placed.extend(zip(new[j1:j2], old[i1:i2]))
+            continue
+        for index, unit in enumerate(new[j1:j2]):
+            previous = old[i1 + index] if i1 + index < i2 else None
+            if previous is not None and previous.kind == unit.kind and (unit.kind in UPDATABLE_TYPES or unit.payload is None):
+                placed.append((unit, previous))
+            else:
+                placed.append((unit, None))
+                if previous is not None:
+                    deleted.append(previous)
+        deleted.extend(old[i1 + j2 - j1:i2])
+    return placed, deleted
+
+
+class PageUpdater:
+    """Brings an existing page in line with a revised blueprint, touching only the blocks that changed.
+
+    The current page is exported with ``process_page`` and diffed level by level against the blueprint. Blocks with
+    the same type and content are kept, edited ones are updated in place, and the rest is appended at its position
+    or deleted. Notion can only insert after an existing block, so a first block that new blocks go in front of is
+    recreated, and subpages and databases can only be created at the end of their parent, so whatever follows a new
+    one is recreated after it. Existing subpages and databases are never recreated: new blocks in front of one go
+    after it instead, and new subpages and databases that would have to go in front of one are created at the end.
+    """
+
+    def __init__(self, notion, max_concurrency=MAX_CONCURRENCY, seed=None):
+        self.materializer = Materializer(notion, max_concurrency, seed)
+        self.notion = notion
+        self.stats = Counter()
+
+    async def run(self, page_id, current, blueprint):
+        self.materializer.track(blueprint)
+        await self.update_page(page_id, current, blueprint)
+        await self.diff_children(page_id, current.get("children", []), blueprint.get("children", []))
+        await self.materializer.join()
+        return self.stats
+
+    async def call(self, operation, method, **kwargs):
+        self.stats[operation] += 1
+        return await self.materializer.call(method, **kwargs)
+
+    async def update_page(self, page_id, current, blueprint):
+        changes = {}
+        if blueprint.get("title") and blueprint["title"] != current.get("title"):
+            changes["properties"] = {"title": {"title": [{"type": "text", "text": {"content": blueprint["title"]}}]}}
+        if blueprint.get("icon") and blueprint["icon"] != current.get("icon"):
+            changes["icon"] = {"emoji": blueprint["icon"]}
+        if changes:
+            await self.call("updated", self.notion.pages.update, page_id=page_id, **changes)
+
+    async def update_database(self, database_id, current, blueprint):
+        changes = {}
+        if blueprint.get("title") and blueprint["title"] != current.get("title"):
+            changes["title"] = [{"type": "text", "text": {"content": blueprint["title"]}}]
+        properties = schema_update(current.get("schema", {}), blueprint.get("schema", {}))
+        if properties is not None:
+            changes["properties"] = properties
+        if blueprint.get("icon") and blueprint["icon"] != current.get("icon"):
+            changes["icon"] = {"emoji": blueprint["icon"]}
+        if changes:
+            await self.call("updated", self.notion.databases.update, database_id=database_id, **changes)
+
+    async def diff_children(self, parent_id, old_children, new_children):
+        old, new = units(old_children), units(new_children)
+        placed, deleted = align(old, new)
+        if placed and placed[0][1] is None and old and not any(unit is old[0] for unit in deleted):
+            if old[0].payload is None:
+                # A subpage or database would lose its contents, so the new blocks go after it instead.
+                first = next(index for index, (_, previous) in enumerate(placed) if previous is old[0])
+                placed = [placed[first]] + placed[:first] + placed[first + 1:]
+            else:
+                # Nothing can be inserted in front of the first block, so it is recreated behind the new ones instead.
+                placed = [(unit, None if previous is old[0] else previous) for unit, previous in placed]
+                deleted = deleted + [old[0]]
+        # New pages and databases always land at the end, so everything after the first one is rewritten there.
+        tail = next((index for index, (unit, previous) in enumerate(placed) if previous is None and unit.payload is None), len(placed))
+        if any(previous is not None and previous.payload is None for _, previous in placed[tail:]):
+            # Unless that would recreate existing subpages or databases, then the new ones are created last instead.
+            created = [(unit, previous) for unit, previous in placed if previous is None and unit.payload is None]
+            placed = [(unit, previous) for unit, previous in placed if previous is not None or unit.payload is not None] + created
+        else:
+            deleted = deleted + [previous for _, previous in placed[tail:] if previous is not None]
+            placed = placed[:tail] + [(unit, None) for unit, _ in placed[tail:]]
+
+        # Blocks going in front of everything else are inserted after the first old block, which is deleted anyway.
+        anchor = old[0].block_id if old else None
+        inserts = []
+        for unit, previous in placed:
+            if previous is None:
+                inserts.append(unit)
+                continue
+            if inserts:
+                await self.insert(parent_id, inserts, anchor)
+                inserts = []
+            anchor = previous.block_id
+            self.materializer.spawn(self.reuse(previous, unit))
+        if inserts:
+            # Nothing that stays comes after these, so they can simply be appended.
+            await self.insert(parent_id, inserts, None)
+
+        for unit in deleted:
+            self.materializer.spawn(self.call("deleted", self.notion.blocks.delete, block_id=unit.block_id))
+
+    async def reuse(self, previous, unit):
+        if unit.kind == "page":
+            await self.update_page(previous.block_id, previous.node, unit.node)
+            await self.diff_children(previous.block_id, previous.node.get("children", []), unit.node.get("children", []))
+            return
+        if unit.kind == "database":
+            await self.update_database(previous.block_id, previous.node, unit.node)
+            return
+
+        if previous.key != unit.key:
+            body = {key: value for key, value in unit.payload[unit.kind].items() if key != "children"}
+            await self.call("updated", self.notion.blocks.update, block_id=previous.block_id, **{unit.kind: body})
+        else:
+            self.stats["kept"] += 1
+
+        if unit.kind in CONTAINER_TYPES:
+            await self.diff_children(previous.block_id, previous.node.get("children", []), unit.node.get("children", []))
+        elif unit.kind == "column_list":
+            columns = zip(previous.node.get("columns", []), unit.node.get("columns", []))
+            for old_column, new_column in columns:
+                await self.diff_children(old_column["id"], old_column.get("children", []), new_column.get("children", []))
+
+    async def insert(self, parent_id, inserts, after):
+        batch, pending, size = [], [], 0
+        for unit in inserts:
+            if unit.payload is None:
+                after = await self.flush(parent_id, batch, pending, after)
+                batch, pending, size = [], [], 0
+                self.stats["inserted"] += 1
+                await self.materializer.materialize(parent_id, unit.node)
+                continue
+            if batch and (len(batch) + 1 > MAX_CHILDREN_PER_REQUEST or size + unit.size > MAX_BLOCKS_PER_REQUEST):
+                after = await self.flush(parent_id, batch, pending, after)
+                batch, pending, size = [], [], 0
+            pending.extend(((len(batch),) + path, children) for path, children in unit.deferred)
+            batch.append(unit.payload)
+            size += unit.size
+        await self.flush(parent_id, batch, pending, after)
+
+    async def flush(self, parent_id, batch, pending, after):
+        self.stats["inserted"] += len(batch)
+        results = await self.materializer.flush_batch(parent_id, batch, [None] * len(batch), pending, after)
+        # Appending at the end needs no anchor, and keeping none keeps pages created in between in place.
+        return results[-1]["id"] if results and after is not None else after
+
+
+async def update_blueprint(page_id, block_json, max_concurrency=MAX_CONCURRENCY, seed=None):
+    async with RateLimitedAsyncClient(auth=NOTION_KEY) as notion:
+        current = await export_page(page_id, True, max_concurrency, notion, use_cache=False)
+        return await PageUpdater(notion, max_concurrency, seed).run(page_id, current, block_json)
@@ -0,0 +1,82 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.environ.get("NOTION_GPT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "notion-gpt"))
+
+MISSING = object()
+
+
+def cache_path(name):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, name)
+
+
+class DiskCache:
+    """A small persistent key/value store backed by SQLite.
+
+    Values are stored as JSON. Entries older than ``ttl`` seconds are treated as missing, and once the cache holds
+    more than ``max_entries`` entries or ``max_bytes`` bytes the least recently used ones are evicted.
+    """
+
+    def __init__(self, path, ttl=None, max_entries=None, max_bytes=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self.lock:
+            row = self.connection.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return default
+            value, created = row
+            if self.ttl is not None and now - created > self.ttl:
+                self.connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+                return default
+            self.connection.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key, value):
+        now = time.time()
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO cache (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, data, len(data), now, now)
+            )
+            self.evict()
+
+    def delete(self, key):
+        with self.lock:
+            self.connection.execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+
+    def evict(self):
+        count, total = self.connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache").fetchone()
+        if (self.max_entries is None or count <= self.max_entries) and (self.max_bytes is None or total <= self.max_bytes):
+            return
+
+        stale = []
+        for key, size in self.connection.execute("SELECT key, size FROM cache ORDER BY accessed").fetchall():
+            if (self.max_entries is None or count <= self.max_entries) and (self.max_bytes is None or total <= self.max_bytes):
+                break
+            stale.append((key,))
+            count -= 1
+            total -= size
+        self.connection.executemany("DELETE FROM cache WHERE key = ?", stale)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
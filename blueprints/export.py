@@ -0,0 +1,157 @@
+import asyncio
+import csv
+import json
+import os
+import time
+from typing import NamedTuple, Optional
+
+from .materializer import MAX_CONCURRENCY
+from .ratelimit import RateLimitedAsyncClient
+from .utils import LIST_TYPES, NOTION_KEY, Crawler, export_page
+
+EXPORT_WORKERS = 4
+FIELDS = ["Prompt", "Response", "Blueprint", "Category"]
+
+
+class PageExport(NamedTuple):
+    """Progress report for one page of a bulk export."""
+    done: int
+    total: int
+    page_id: str
+    title: Optional[str]
+    duration: float
+    error: Optional[Exception] = None
+
+
+class ExportWriter:
+    """Appends exported pages to a CSV or JSONL file in the shape of ``data/example_blueprints.csv``.
+
+    Next to the output, ``<output>.progress`` records every page written along with the file's size after it. An
+    export that is restarted skips the pages recorded there and cuts off anything written after the last of them,
+    such as a row left half written by a crash. Any other existing file is only overwritten with ``fresh``.
+    """
+
+    def __init__(self, path, fresh=False):
+        self.path = path
+        self.progress_path = path + ".progress"
+        self.format = "csv" if path.lower().endswith(".csv") else "jsonl"
+        self.done = set()
+
+        resuming = not fresh and os.path.exists(self.progress_path)
+        if not fresh and not resuming and os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            raise FileExistsError(f"{self.path} already exists and is not an unfinished export, pass fresh to overwrite it")
+
+        offset = 0
+        if resuming:
+            with open(self.progress_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.done.add(entry["id"])
+                        offset = entry["offset"]
+        with open(self.path, "ab") as file:
+            file.truncate(offset)
+        if not self.done:
+            open(self.progress_path, "w").close()
+
+        encoding = "utf-8-sig" if self.format == "csv" else "utf-8"
+        self.file = open(self.path, "a", encoding=encoding, newline="")
+        self.progress = open(self.progress_path, "a", encoding="utf-8")
+        if self.format == "csv":
+            self.csv = csv.DictWriter(self.file, FIELDS)
+            if offset == 0:
+                self.csv.writeheader()
+
+    def write(self, page_id, row):
+        if self.format == "csv":
+            self.csv.writerow(row)
+        else:
+            self.file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self.progress.write(json.dumps({"id": page_id, "offset": self.file.tell()}) + "\n")
+        self.progress.flush()
+        self.done.add(page_id)
+
+    def close(self):
+        self.file.close()
+        self.progress.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def blueprint_row(blueprint, category=""):
+    # Prompts and responses are written by hand, the export only supplies the blueprint they describe.
+    return {"Prompt": "", "Response": "", "Blueprint": json.dumps(blueprint, indent=4), "Category": category}
+
+
+async def discover_pages(notion, root_id, max_concurrency=MAX_CONCURRENCY):
+    """The ``(id, title)`` of every page directly under ``root_id``, including ones inside toggles and columns."""
+    crawler = Crawler(notion, max_concurrency, icons=False, schemas=False)
+
+    async def walk(block_id):
+        blocks = await crawler.list_children(block_id)
+        containers = [block["id"] for block in blocks if block["type"] != "child_page" and block["type"] not in LIST_TYPES
+                      and block.get("has_children", False)]
+        nested = dict(zip(containers, await asyncio.gather(*(walk(block_id) for block_id in containers))))
+        pages = []
+        for block in blocks:
+            if block["type"] == "child_page":
+                pages.append((block["id"], block["child_page"]["title"]))
+            elif block["id"] in nested:
+                pages.extend(nested[block["id"]])
+        return pages
+
+    return await walk(root_id)
+
+
+async def export_pages(writer, page_ids=(), root_id=None, workers=EXPORT_WORKERS, max_concurrency=MAX_CONCURRENCY,
+                       category="", use_cache=True, on_progress=None):
+    """Exports pages into ``writer`` with ``workers`` pages in flight, sharing one client and its rate limit.
+
+    Pages come from ``page_ids`` and, with a ``root_id``, from the pages under it. Pages the writer already has are
+    skipped, and a page that fails is reported to ``on_progress`` and left for the next run. Returns the number of
+    pages exported and failed.
+    """
+    async with RateLimitedAsyncClient(auth=NOTION_KEY) as notion:
+        pages = [(page_id, None) for page_id in page_ids]
+        if root_id is not None:
+            pages.extend(await discover_pages(notion, root_id, max_concurrency))
+        seen = set(writer.done)
+        queue = asyncio.Queue()
+        for page_id, title in pages:
+            if page_id not in seen:
+                seen.add(page_id)
+                queue.put_nowait((page_id, title))
+
+        total = queue.qsize()
+        counts = {"exported": 0, "failed": 0}
+
+        async def worker():
+            while not queue.empty():
+                page_id, title = queue.get_nowait()
+                started = time.monotonic()
+                try:
+                    blueprint = await export_page(page_id, False, max_concurrency, notion, use_cache)
+                    writer.write(page_id, blueprint_row(blueprint, category))
+                    counts["exported"] += 1
+                    error, title = None, blueprint.get("title")
+                except Exception as e:
+                    counts["failed"] += 1
+                    error = e
+                if on_progress is not None:
+                    on_progress(PageExport(counts["exported"] + counts["failed"], total, page_id, title,
+                                           time.monotonic() - started, error))
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        return counts["exported"], counts["failed"]
+
+
+def export_workspace(output, page_ids=(), root_id=None, workers=EXPORT_WORKERS, max_concurrency=MAX_CONCURRENCY,
+                     category="", use_cache=True, fresh=False, on_progress=None):
+    with ExportWriter(output, fresh) as writer:
+        return asyncio.run(export_pages(writer, page_ids, root_id, workers, max_concurrency, category, use_cache,
+                                        on_progress))
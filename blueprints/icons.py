@@ -0,0 +1,121 @@
+import random
+import re
+import threading
+from collections import defaultdict
+
+import emoji
+
+from .text import STOPWORDS
+
+MIN_WORD_LENGTH = 2
+SKIN_TONES_AND_JOINERS = ("🏻", "🏼", "🏽", "🏾", "🏿", "\u200d")
+REGIONAL_INDICATORS = tuple(chr(code) for code in range(0x1F1E6, 0x1F200))
+
+# Words that show up in template titles but never in emoji names.
+SYNONYMS = {
+    "budget": ["money", "dollar"],
+    "finance": ["money", "chart"],
+    "expense": ["money"],
+    "event": ["calendar", "party"],
+    "schedule": ["calendar"],
+    "meeting": ["calendar", "handshake"],
+    "note": ["memo", "notebook"],
+    "doc": ["page", "memo"],
+    "document": ["page", "file"],
+    "resource": ["books", "link"],
+    "task": ["check", "clipboard"],
+    "todo": ["check"],
+    "goal": ["bullseye", "trophy"],
+    "project": ["clipboard", "rocket"],
+    "plan": ["clipboard", "notepad"],
+    "idea": ["bulb"],
+    "travel": ["airplane", "map"],
+    "trip": ["airplane", "luggage"],
+    "habit": ["repeat", "check"],
+    "health": ["heart", "medical"],
+    "fitness": ["flexed", "running"],
+    "workout": ["flexed", "weight"],
+    "recipe": ["cooking", "fork"],
+    "study": ["books", "graduation"],
+    "class": ["school", "books"],
+    "course": ["graduation", "books"],
+    "research": ["microscope", "magnifying"],
+    "marketing": ["megaphone"],
+    "campaign": ["megaphone"],
+    "news": ["newspaper"],
+    "photo": ["camera"],
+    "team": ["busts", "handshake"],
+    "contact": ["telephone", "envelope"],
+    "reading": ["books"],
+    "brief": ["clipboard", "memo"],
+    "overview": ["telescope", "magnifying"],
+    "dashboard": ["chart", "bar"],
+    "home": ["house"],
+    "hub": ["house", "link"],
+}
+
+lock = threading.Lock()
+pool = None
+index = None
+
+
+def word_forms(word):
+    if len(word) > 3 and word.endswith("s"):
+        return [word, word[:-1]]
+    return [word]
+
+
+def tokenize(text):
+    return [form for word in re.findall(r"[a-z0-9]+", text.lower()) for form in word_forms(word)]
+
+
+def build_index():
+    global pool, index
+    with lock:
+        if pool is not None:
+            return
+        emojis = sorted(em for em in emoji.EMOJI_DATA
+                        if not any(char in em for char in SKIN_TONES_AND_JOINERS)
+                        and not em.startswith(REGIONAL_INDICATORS))
+        inverted = defaultdict(set)
+        for em in emojis:
+            data = emoji.EMOJI_DATA[em]
+            for name in [data.get("en", "")] + list(data.get("alias", [])):
+                for token in tokenize(name):
+                    inverted[token].add(em)
+        index = {token: sorted(matches) for token, matches in inverted.items()}
+        pool = emojis
+
+
+def pick_icon(title="", seed=None):
+    """Pick an emoji whose name best matches the title, or a random one if nothing matches.
+
+    With a ``seed`` the choice depends only on the seed and the title, so reproducible runs stay reproducible
+    no matter in which order pages are materialized.
+    """
+    if pool is None:
+        build_index()
+
+    rng = random.Random(f"{seed}:{title}") if seed is not None else random
+
+    # Curated synonyms beat literal name matches ("notes" should be a memo, not musical notes), and each word of
+    # the title counts once however many of its forms match.
+    scores = defaultdict(int)
+    for word in re.findall(r"[a-z0-9]+", title.lower()):
+        if len(word) < MIN_WORD_LENGTH or word in STOPWORDS:
+            # Filler words match emoji names too: "The Tasks of the Team" would get "sign of the horns".
+            continue
+        weights = {}
+        for form in word_forms(word):
+            for em in index.get(form, ()):
+                weights[em] = max(weights.get(em, 0), 1)
+            for keyword in SYNONYMS.get(form, []):
+                for em in index.get(keyword, ()):
+                    weights[em] = 2
+        for em, weight in weights.items():
+            scores[em] += weight
+
+    if not scores:
+        return rng.choice(pool)
+    best = max(scores.values())
+    return rng.choice(sorted(em for em, score in scores.items() if score == best))
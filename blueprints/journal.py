@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+
+from .diskcache import cache_path
+
+JOURNAL_TTL = 24 * 60 * 60
+
+ROOT_NODE = "#0"
+PENDING = object()
+
+# Owners of the runs this process has going, each with the journals it holds.
+live_owners = {}
+
+
+@lru_cache(maxsize=None)
+def connect(path):
+    connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("CREATE TABLE IF NOT EXISTS runs (run TEXT PRIMARY KEY, content TEXT NOT NULL, created REAL NOT NULL)")
+    connection.execute(
+        "CREATE TABLE IF NOT EXISTS entries "
+        "(seq INTEGER PRIMARY KEY AUTOINCREMENT, run TEXT NOT NULL, node TEXT NOT NULL, parent TEXT NOT NULL, "
+        "block_id TEXT, created REAL NOT NULL, UNIQUE (run, node))"
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS entries_parent ON entries (run, parent)")
+    connection.execute("CREATE TABLE IF NOT EXISTS owners (run TEXT PRIMARY KEY, owner TEXT NOT NULL, pid INTEGER NOT NULL, claimed REAL NOT NULL)")
+    return connection
+
+
+def run_id(*parts):
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":")).encode()).hexdigest()
+
+
+def is_alive(owner, pid):
+    if pid == os.getpid():
+        return owner in live_owners
+    if os.name == "nt":
+        # os.kill would end the process rather than probe it, so the claim holds until the run expires.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def ownership():
+    """A new owner for the journals of one run, including all of its attempts, that holds them until the block exits."""
+    owner = uuid.uuid4().hex
+    with Journal.lock:
+        live_owners[owner] = []
+    try:
+        yield owner
+    finally:
+        with Journal.lock:
+            journals = live_owners.pop(owner)
+        for journal in journals:
+            journal.release()
+
+
+def open_journal(owner, *parts):
+    """The journal of the run described by ``parts``, claimed for ``owner``.
+
+    While another run that is still going holds it, ``owner`` gets a journal of its own instead, so identical runs
+    never write to or clear each other's entries. Attempts of the same run keep using whichever journal they got.
+    """
+    own = Journal(run_id(*parts, owner), owner)
+    if own.holder() == owner:
+        return own
+    shared = Journal(run_id(*parts), owner)
+    if shared.claim():
+        return shared
+    own.claim()
+    return own
+
+
+class Journal:
+    """Write-ahead record of the Notion blocks a materialization has created, keyed by blueprint node path.
+
+    Every create or append first records its intent and then the IDs it got back, so a failed run can be resumed by
+    materializing the same blueprint again: nodes that already exist are skipped and their recorded IDs reused.
+    Entries of a run are dropped once it completes, and runs older than ``JOURNAL_TTL`` are not resumed.
+
+    A journal is only written by the ``owner`` that claimed it. Others can claim it once that owner has finished
+    or its process has died.
+    """
+
+    lock = threading.Lock()
+
+    def __init__(self, run, owner=None, path=None):
+        self.run = run
+        self.owner = owner
+        self.connection = connect(path or cache_path("journal.sqlite3"))
+        self.expire()
+
+    def expire(self):
+        # Pages of runs abandoned this long ago may well have been deleted, so they are not resumed.
+        expired = (self.run, time.time() - JOURNAL_TTL)
+        with self.lock:
+            self.connection.execute("DELETE FROM runs WHERE run = ? AND created < ?", expired)
+            self.connection.execute("DELETE FROM owners WHERE run = ? AND claimed < ?", expired)
+            self.connection.execute(
+                "DELETE FROM entries WHERE run = ? AND (SELECT MIN(created) FROM entries WHERE run = ?) < ?",
+                (self.run, *expired)
+            )
+
+    def holder(self):
+        with self.lock:
+            row = self.connection.execute("SELECT owner FROM owners WHERE run = ?", (self.run,)).fetchone()
+        return None if row is None else row[0]
+
+    def claim(self):
+        """Takes the run for ``owner``, unless another owner that is still going holds it. Returns whether it did."""
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.connection.execute("SELECT owner, pid FROM owners WHERE run = ?", (self.run,)).fetchone()
+                if row is not None and row[0] != self.owner and is_alive(*row):
+                    return False
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO owners (run, owner, pid, claimed) VALUES (?, ?, ?, ?)",
+                    (self.run, self.owner, os.getpid(), time.time())
+                )
+            finally:
+                self.connection.execute("COMMIT")
+            if self.owner in live_owners:
+                live_owners[self.owner].append(self)
+        return True
+
+    def release(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM owners WHERE run = ? AND owner = ?", (self.run, self.owner))
+
+    def load(self):
+        """Returns the response this run is materializing, if an earlier attempt got that far."""
+        with self.lock:
+            row = self.connection.execute("SELECT content FROM runs WHERE run = ?", (self.run,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def save(self, content):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO runs (run, content, created) VALUES (?, ?, ?)",
+                (self.run, json.dumps(content, ensure_ascii=False, separators=(",", ":")), time.time())
+            )
+
+    def discard(self):
+        """Forgets the blocks recorded so far, but keeps the saved response."""
+        with self.lock:
+            self.connection.execute("DELETE FROM entries WHERE run = ?", (self.run,))
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM runs WHERE run = ?", (self.run,))
+            self.connection.execute("DELETE FROM entries WHERE run = ?", (self.run,))
+
+    def lookup(self, nodes):
+        """Returns the recorded block ID of each node, ``PENDING`` for a call that never reported back, or ``None``."""
+        with self.lock:
+            rows = dict(self.connection.execute(
+                f"SELECT node, block_id FROM entries WHERE run = ? AND node IN ({','.join('?' * len(nodes))})",
+                (self.run, *nodes)
+            ).fetchall())
+        return [PENDING if node in rows and rows[node] is None else rows.get(node) for node in nodes]
+
+    def intend(self, parent_id, nodes):
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO entries (run, node, parent, block_id, created) VALUES (?, ?, ?, NULL, ?)",
+                [(self.run, node, parent_id, now) for node in nodes]
+            )
+
+    def record(self, parent_id, created):
+        now = time.time()
+        with self.lock:
+            self.connection.executemany(
+                "INSERT INTO entries (run, node, parent, block_id, created) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (run, node) DO UPDATE SET block_id = excluded.block_id",
+                [(self.run, node, parent_id, block_id, now) for node, block_id in created]
+            )
+
+    def owns(self, block_id):
+        """Whether ``block_id`` is part of what this run built, rather than the page it builds under."""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM entries WHERE run = ? AND node = ? AND parent = ?", (self.run, ROOT_NODE, block_id)
+            ).fetchone()
+        return row is None
+
+    def adopt(self, parent_id, children):
+        """Settles the calls under ``parent_id`` that never reported back, given the parent's current children.
+
+        Blocks under one parent are created in order, and children created inline with their parent are intended
+        before anything appended to it, so children the journal does not know are the results of those calls, in the
+        order they were made. Calls left without a block did not happen and are forgotten.
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT node, block_id FROM entries WHERE run = ? AND parent = ? ORDER BY seq", (self.run, parent_id)
+            ).fetchall()
+            known = {block_id for _, block_id in rows if block_id is not None}
+            unknown = [block_id for block_id in children if block_id not in known]
+            pending = [node for node, block_id in rows if block_id is None]
+            self.connection.executemany(
+                "UPDATE entries SET block_id = ? WHERE run = ? AND node = ?",
+                [(block_id, self.run, node) for node, block_id in zip(pending, unknown)]
+            )
+            self.connection.executemany(
+                "DELETE FROM entries WHERE run = ? AND node = ?", [(self.run, node) for node in pending[len(unknown):]]
+            )
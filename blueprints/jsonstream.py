@@ -0,0 +1,285 @@
+import json
+import re
+from typing import NamedTuple
+
+WHITESPACE = " \t\n\r"
+LITERAL_CHARS = "0123456789+-.eEtruefalsn"
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class ResponseDelta(NamedTuple):
+    text: str
+
+
+class BlueprintStarted(NamedTuple):
+    header: dict
+
+
+class ChildCompleted(NamedTuple):
+    index: int
+    child: dict
+
+
+class Done(NamedTuple):
+    content: dict
+    repaired: bool
+
+
+class Frame:
+    __slots__ = ("kind", "path", "value", "key", "expect")
+
+    def __init__(self, kind, path):
+        self.kind = kind
+        self.path = path
+        self.value = {} if kind == "object" else []
+        self.key = None
+        self.expect = "key" if kind == "object" else "value"
+
+
+class BlueprintStreamParser:
+    """Incremental parser for the model's ``{"response": ..., "blueprint": {...}}`` output.
+
+    Chunks are fed as they stream in and each character is looked at once, so a chunk costs time proportional to
+    its own length. The object is built as it is parsed and ``feed`` returns typed events as soon as they can be
+    known: ``ResponseDelta`` for each decoded piece of the ``response`` text, ``BlueprintStarted`` once the
+    blueprint's children array opens (with the fields seen before it, such as the title and icon),
+    ``ChildCompleted`` for every fully received top-level child of the blueprint, and ``Done`` with the whole
+    content once the root object closes.
+
+    If the stream ends early, ``finish`` closes whatever is still open and returns a ``Done`` marked as repaired.
+    Text that is not valid JSON sets ``failed`` and stops parsing, leaving heavier repair to the caller.
+    """
+
+    def __init__(self):
+        self.stack = []
+        self.content = None
+        self.failed = False
+        self.started = False
+        self.string = None
+        self.string_path = None
+        self.escape = None
+        self.high_surrogate = None
+        self.literal = None
+
+    @property
+    def done(self):
+        return self.content is not None
+
+    def feed(self, chunk):
+        events = []
+        position = 0
+        length = len(chunk)
+
+        while position < length and not self.done and not self.failed:
+            if self.string is not None:
+                position = self.scan_string(chunk, position, events)
+                continue
+
+            char = chunk[position]
+
+            if self.literal is not None:
+                if char in LITERAL_CHARS:
+                    self.literal.append(char)
+                    position += 1
+                    continue
+                self.end_literal()
+                continue
+
+            frame = self.stack[-1] if self.stack else None
+            if char in WHITESPACE:
+                pass
+            elif frame is None:
+                # Anything before the root object (such as a markdown fence) is skipped.
+                if char == "{":
+                    self.stack.append(Frame("object", ()))
+            elif char == '"':
+                if frame.kind == "object" and frame.expect == "key":
+                    self.string = []
+                    self.string_path = None
+                elif frame.expect == "value":
+                    self.string = []
+                    self.string_path = self.value_path()
+                else:
+                    self.failed = True
+            elif char in "{[":
+                if frame.expect != "value":
+                    self.failed = True
+                else:
+                    path = self.value_path()
+                    self.stack.append(Frame("object" if char == "{" else "array", path))
+                    if path == ("blueprint", "children") and not self.started:
+                        self.started = True
+                        events.append(BlueprintStarted(dict(frame.value)))
+            elif char in "}]":
+                # Trailing commas are tolerated, a key without a value is not.
+                if frame.kind != ("object" if char == "}" else "array") or frame.expect == "colon" or (frame.kind == "object" and frame.expect == "value"):
+                    self.failed = True
+                else:
+                    self.close_frame(events)
+            elif char == ":":
+                if frame.expect != "colon":
+                    self.failed = True
+                else:
+                    frame.expect = "value"
+            elif char == ",":
+                if frame.expect != "comma":
+                    self.failed = True
+                else:
+                    frame.expect = "key" if frame.kind == "object" else "value"
+            elif char in LITERAL_CHARS and frame.expect == "value":
+                self.literal = [char]
+            else:
+                self.failed = True
+
+            position += 1
+
+        return merge_deltas(events)
+
+    def finish(self):
+        """Close a truncated stream, keeping everything that was fully or partially received."""
+        if self.done or self.failed or not self.stack:
+            return []
+
+        events = []
+        if self.string is not None:
+            if self.string_path is not None:
+                self.add_value(self.take_string())
+            self.string = None
+        if self.literal is not None:
+            try:
+                self.add_value(json.loads("".join(self.literal)))
+            except ValueError:
+                pass
+            self.literal = None
+
+        while self.stack:
+            frame = self.stack.pop()
+            if self.stack:
+                self.add_value(frame.value)
+            else:
+                self.content = frame.value
+
+        events.append(Done(self.content, True))
+        return events
+
+    def value_path(self):
+        frame = self.stack[-1]
+        return frame.path + ((frame.key,) if frame.kind == "object" else (len(frame.value),))
+
+    def scan_string(self, chunk, position, events):
+        length = len(chunk)
+        while position < length:
+            if self.escape == "":
+                char = chunk[position]
+                position += 1
+                if char == "u":
+                    self.escape = "u"
+                else:
+                    self.escape = None
+                    self.append_text(ESCAPES.get(char, char), events)
+                continue
+
+            if self.escape is not None:
+                needed = 5 - len(self.escape)
+                self.escape += chunk[position:position + needed]
+                position = min(length, position + needed)
+                if len(self.escape) == 5:
+                    try:
+                        code = int(self.escape[1:], 16)
+                    except ValueError:
+                        self.failed = True
+                        return length
+                    self.escape = None
+                    self.append_code(code, events)
+                continue
+
+            match = STRING_SPECIAL.search(chunk, position)
+            end = match.start() if match else length
+            if end > position:
+                self.append_text(chunk[position:end], events)
+            if match is None:
+                return length
+            if chunk[end] == '"':
+                self.end_string()
+                return end + 1
+            self.escape = ""
+            position = end + 1
+
+        return position
+
+    def append_code(self, code, events):
+        if 0xD800 <= code < 0xDC00:
+            if self.high_surrogate is not None:
+                self.append_text("", events)
+            self.high_surrogate = code
+        elif 0xDC00 <= code < 0xE000 and self.high_surrogate is not None:
+            combined = 0x10000 + ((self.high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+            self.high_surrogate = None
+            self.append_text(chr(combined), events)
+        else:
+            self.append_text(chr(code), events)
+
+    def append_text(self, text, events):
+        if self.high_surrogate is not None:
+            text = chr(self.high_surrogate) + text
+            self.high_surrogate = None
+        if not text:
+            return
+        self.string.append(text)
+        if self.string_path == ("response",):
+            events.append(ResponseDelta(text))
+
+    def take_string(self):
+        if self.high_surrogate is not None:
+            self.string.append(chr(self.high_surrogate))
+            self.high_surrogate = None
+        value = "".join(self.string)
+        self.string = None
+        return value
+
+    def end_string(self):
+        is_key = self.string_path is None
+        value = self.take_string()
+        if is_key:
+            self.stack[-1].key = value
+            self.stack[-1].expect = "colon"
+        else:
+            self.add_value(value)
+
+    def end_literal(self):
+        try:
+            value = json.loads("".join(self.literal))
+        except ValueError:
+            self.failed = True
+            return
+        self.literal = None
+        self.add_value(value)
+
+    def close_frame(self, events):
+        frame = self.stack.pop()
+        if not self.stack:
+            self.content = frame.value
+            events.append(Done(frame.value, False))
+            return
+        if len(frame.path) == 3 and frame.path[:2] == ("blueprint", "children") and frame.kind == "object":
+            events.append(ChildCompleted(frame.path[2], frame.value))
+        self.add_value(frame.value)
+
+    def add_value(self, value):
+        frame = self.stack[-1]
+        if frame.kind == "object":
+            frame.value[frame.key] = value
+        else:
+            frame.value.append(value)
+        frame.expect = "comma"
+
+
+def merge_deltas(events):
+    merged = []
+    for event in events:
+        if isinstance(event, ResponseDelta) and merged and isinstance(merged[-1], ResponseDelta):
+            merged[-1] = ResponseDelta(merged[-1].text + event.text)
+        else:
+            merged.append(event)
+    return merged
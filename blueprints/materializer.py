@@ -0,0 +1,394 @@
+import asyncio
+import os
+from typing import NamedTuple
+
+from .blocks import (MAX_CHILDREN_PER_REQUEST, MAX_BLOCKS_PER_REQUEST, MAX_NESTING_DEPTH, page_payload,
+                     database_payload, column_list_block, column_block, divider_block, table_of_contents_block,
+                     heading_block, paragraph_block, list_blocks, todo_list_blocks, toggle_block, callout_block,
+                     quote_block)
+from .covers import get_unsplash_image_url, prefetch_covers
+from .icons import pick_icon
+from .journal import PENDING
+from .ratelimit import RateLimitedAsyncClient
+
+NOTION_KEY = os.environ["NOTION_KEY"]
+MAX_CONCURRENCY = 4
+
+# Blocks that cannot be sent through blocks.children.append, so they close the current batch.
+UNBATCHED_TYPES = ("page", "database")
+# Column lists use both levels of nesting themselves, so they can only be inlined at the top of a request.
+UNNESTABLE_TYPES = UNBATCHED_TYPES + ("column_list",)
+
+
+class Continuation(NamedTuple):
+    """The blocks of ``node`` from ``start`` on, deferred when only its first ones fit where it belongs."""
+    node: dict
+    start: int
+
+
+def collect_titles(block_json):
+    titles = []
+    if block_json["type"] == "page":
+        titles.append(block_json.get("title", "Untitled Page"))
+    elif block_json["type"] == "database":
+        titles.append(block_json.get("title", "Untitled Database"))
+
+    for child in block_json.get("children") or []:
+        titles.extend(collect_titles(child))
+    for column in block_json.get("columns") or []:
+        titles.extend(collect_titles(column))
+    return titles
+
+
+def node_paths(block_json, path=""):
+    """Maps every node of a blueprint subtree to its path, the key it is recorded under in a ``Journal``."""
+    paths = {id(block_json): path}
+    prefix = f"{path}." if path else ""
+    for index, child in enumerate(block_json.get("children") or []):
+        paths.update(node_paths(child, f"{prefix}{index}"))
+    for column_index, column in enumerate(block_json.get("columns") or []):
+        for index, child in enumerate(column.get("children") or []):
+            paths.update(node_paths(child, f"{prefix}c{column_index}.{index}"))
+    return paths
+
+
+def build_blocks(block_json):
+    block_type = block_json["type"]
+
+    if block_type == "divider":
+        return [divider_block()]
+
+    elif block_type == "table_of_contents":
+        return [table_of_contents_block()]
+
+    elif block_type.startswith("heading_"):
+        text = block_json.get("text", "")
+        level = int(block_type.split("_")[1])
+        return [heading_block(text, level)]
+
+    elif block_type == "paragraph":
+        return [paragraph_block(block_json.get("content", []))]
+
+    elif block_type in ["bulleted_list", "numbered_list"]:
+        return list_blocks(block_json.get("items", []), bulleted=block_type == "bulleted_list")
+
+    elif block_type == "to_do_list":
+        return todo_list_blocks(block_json.get("items", []))
+
+    elif block_type == "toggle":
+        return [toggle_block(block_json.get("text") or block_json.get("title", "Untitled Toggle"))]
+
+    elif block_type == "callout":
+        icon = block_json.get("icon", "💡")
+        color = block_json.get("color", "default")
+        return [callout_block(block_json.get("content", []), icon, color)]
+
+    elif block_type == "quote":
+        return [quote_block(block_json.get("content", []))]
+
+    return []
+
+
+def compile_block(block_json, depth=0, budget=MAX_BLOCKS_PER_REQUEST):
+    """Compile a blueprint subtree into nested append payloads.
+
+    Returns ``(payloads, deferred, size)``. Children are inlined up to Notion's nesting and size limits; whatever
+    does not fit is returned in ``deferred`` as ``(path, children)`` pairs, where ``path`` indexes into the nested
+    payloads and the children must be appended to that block once it exists.
+    """
+    if block_json["type"] == "column_list":
+        return compile_column_list(block_json, budget)
+
+    payloads = build_blocks(block_json)
+    children = block_json.get("children") or []
+    if not payloads or not children:
+        return payloads, [], len(payloads)
+
+    container = payloads[0]
+    inlined, deferred, size, remaining = [], [], 0, children
+    if depth < MAX_NESTING_DEPTH:
+        inlined, deferred, size, remaining = compile_children(children, depth + 1, budget - 1)
+
+    if inlined:
+        container[container["type"]]["children"] = inlined
+    # Only a suffix is ever deferred, so appending it afterwards keeps the children in order.
+    if remaining:
+        deferred.append(((), remaining))
+
+    return payloads, deferred, size + 1
+
+
+def compile_column_list(block_json, budget=MAX_BLOCKS_PER_REQUEST):
+    columns = []
+    deferred = []
+    size = 1
+    column_jsons = block_json.get("columns", [])
+
+    for index, column in enumerate(column_jsons):
+        children = column.get("children", [])
+        # Columns cannot be created empty, so room is kept for each later column and its first block.
+        available = budget - size - 1 - 2 * (len(column_jsons) - index - 1)
+        inlined, column_deferred, column_size, remaining = compile_children(children, 2, available)
+        if not inlined and children and children[0]["type"] not in UNNESTABLE_TYPES:
+            # Only a list can be too big for its column on its own. Its first items go in, the rest follow them.
+            payloads, child_deferred, _ = compile_block(children[0], 2)
+            fit = max(1, min(MAX_CHILDREN_PER_REQUEST, available))
+            inlined, column_size = payloads[:fit], len(payloads[:fit])
+            column_deferred = [((0,) + path, grandchildren) for path, grandchildren in child_deferred]
+            remaining = ([Continuation(children[0], fit)] if fit < len(payloads) else []) + children[1:]
+        if not inlined:
+            # Notion rejects empty columns, so a column that is empty in the blueprint holds an empty paragraph.
+            inlined, column_size = [paragraph_block([])], 1
+        columns.append(column_block(inlined))
+        size += column_size + 1
+
+        for path, grandchildren in column_deferred:
+            deferred.append(((index,) + path, grandchildren))
+        if remaining:
+            deferred.append(((index,), remaining))
+
+    return [column_list_block(columns)], deferred, size
+
+
+def nested_payload(payloads, path):
+    payload = payloads[path[0]]
+    for index in path[1:]:
+        payload = payload[payload["type"]]["children"][index]
+    return payload
+
+
+def compile_children(children, depth, budget):
+    inlined = []
+    deferred = []
+    size = 0
+    remaining = children
+
+    for index, child in enumerate(children):
+        if child["type"] in UNNESTABLE_TYPES:
+            break
+        child_payloads, child_deferred, child_size = compile_block(child, depth, budget - size)
+        if len(inlined) + len(child_payloads) > MAX_CHILDREN_PER_REQUEST or size + child_size > budget:
+            break
+        for path, grandchildren in child_deferred:
+            deferred.append(((len(inlined),) + path, grandchildren))
+        inlined.extend(child_payloads)
+        size += child_size
+        remaining = children[index + 1:]
+
+    return inlined, deferred, size, remaining
+
+
+class Materializer:
+    """Writes a blueprint to Notion, filling independent subtrees concurrently.
+
+    Blocks under a single parent are always created in blueprint order. Once a page, container or column exists,
+    its contents are materialized in a separate task, so sibling subpages and databases build side by side. The
+    number of in-flight Notion requests is bounded by ``max_concurrency``.
+
+    With a ``journal``, every block created is recorded under its node path, and nodes the journal already holds
+    are skipped, so materializing the same blueprint again picks up where a failed run stopped. Nodes must be
+    registered with ``track`` before they are materialized.
+    """
+
+    def __init__(self, notion, max_concurrency=MAX_CONCURRENCY, seed=None, covers=None, journal=None):
+        self.notion = notion
+        self.seed = seed
+        self.covers = covers or {}
+        self.cover_tasks = {}
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.tasks = []
+        self.journal = journal
+        self.paths = {}
+
+    async def run(self, parent_id, block_json):
+        self.track(block_json)
+        await self.materialize(parent_id, block_json)
+        await self.join()
+
+    def track(self, block_json, path=""):
+        self.paths.update(node_paths(block_json, path))
+
+    def keys(self, block_json, count=1):
+        path = self.paths[id(block_json)]
+        return [f"{path}#{index}" for index in range(count)]
+
+    async def recorded(self, parent_id, keys):
+        """The block IDs the journal holds for ``keys``, ``None`` for those that still have to be created."""
+        if self.journal is None:
+            return [None] * len(keys)
+        block_ids = self.journal.lookup(keys)
+        if PENDING in block_ids and self.journal.owns(parent_id):
+            # An earlier run died between a request and its response, the parent shows whether it went through.
+            children = await self.list_children(parent_id)
+            self.journal.adopt(parent_id, [child["id"] for child in children])
+            block_ids = self.journal.lookup(keys)
+        return [None if block_id is PENDING else block_id for block_id in block_ids]
+
+    async def create(self, parent_id, key, method, **kwargs):
+        if self.journal is None:
+            return (await self.call(method, **kwargs))["id"]
+        self.journal.intend(parent_id, [key])
+        block_id = (await self.call(method, **kwargs))["id"]
+        self.journal.record(parent_id, [(key, block_id)])
+        return block_id
+
+    async def join(self):
+        try:
+            while self.tasks:
+                tasks, self.tasks = self.tasks, []
+                done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+                self.tasks.extend(pending)
+                for task in done:
+                    task.result()
+        except BaseException:
+            for task in self.tasks:
+                task.cancel()
+            raise
+
+    def spawn(self, coro):
+        self.tasks.append(asyncio.ensure_future(coro))
+
+    async def call(self, method, **kwargs):
+        async with self.semaphore:
+            return await method(**kwargs)
+
+    async def append_children(self, parent_id, children, keys=None, after=None):
+        results = []
+        for start in range(0, len(children), MAX_CHILDREN_PER_REQUEST):
+            end = start + MAX_CHILDREN_PER_REQUEST
+            if self.journal is not None:
+                self.journal.intend(parent_id, keys[start:end])
+            position = {"after": after} if after is not None else {}
+            response = await self.call(self.notion.blocks.children.append, block_id=parent_id,
+                                       children=children[start:end], **position)
+            if self.journal is not None:
+                self.journal.record(parent_id, zip(keys[start:end], [result["id"] for result in response["results"]]))
+            results.extend(response["results"])
+            if after is not None:
+                after = results[-1]["id"]
+        return results
+
+    async def list_children(self, block_id):
+        children = []
+        kwargs = {"block_id": block_id}
+        while True:
+            response = await self.call(self.notion.blocks.children.list, **kwargs)
+            children.extend(response["results"])
+            if not response.get("has_more"):
+                return children
+            kwargs["start_cursor"] = response["next_cursor"]
+
+    def prefetch(self, titles):
+        titles = [title for title in titles if title not in self.covers and title not in self.cover_tasks]
+        if titles:
+            task = asyncio.ensure_future(asyncio.to_thread(prefetch_covers, titles))
+            self.cover_tasks.update((title, task) for title in titles)
+
+    async def cover_url(self, title):
+        if title in self.cover_tasks:
+            self.covers.update(await self.cover_tasks.pop(title))
+        if title not in self.covers:
+            self.covers[title] = await asyncio.to_thread(get_unsplash_image_url, title)
+        return self.covers[title]
+
+    async def create_page(self, parent_id, block_json):
+        key, = self.keys(block_json)
+        page_id, = await self.recorded(parent_id, [key])
+        if page_id is not None:
+            return page_id
+        title = block_json.get("title", "Untitled Page")
+        icon = block_json.get("icon") or pick_icon(title, self.seed)
+        image_url = await self.cover_url(title)
+        return await self.create(parent_id, key, self.notion.pages.create, **page_payload(parent_id, title, icon, image_url))
+
+    async def materialize(self, parent_id, block_json):
+        block_type = block_json["type"]
+
+        if block_type == "page":
+            page_id = await self.create_page(parent_id, block_json)
+            self.spawn(self.materialize_children(page_id, block_json.get("children", [])))
+
+        elif block_type == "database":
+            key, = self.keys(block_json)
+            database_id, = await self.recorded(parent_id, [key])
+            if database_id is not None:
+                return
+            title = block_json.get("title", "Untitled Database")
+            icon = block_json.get("icon") or pick_icon(title, self.seed)
+            schema = block_json.get("schema", {})
+            is_inline = block_json.get("is_inline", False)
+            image_url = await self.cover_url(title)
+            await self.create(parent_id, key, self.notion.databases.create,
+                              **database_payload(parent_id, title, icon, schema, is_inline, image_url))
+
+        else:
+            await self.materialize_children(parent_id, [block_json])
+
+    async def materialize_children(self, parent_id, children):
+        batch = []
+        keys = []
+        pending = []
+        batch_size = 0
+
+        for child in children:
+            if isinstance(child, Continuation):
+                payloads, deferred, _ = compile_block(child.node)
+                payloads, deferred, size = payloads[child.start:], [], len(payloads) - child.start
+                child_keys = self.keys(child.node, len(payloads) + child.start)[child.start:]
+            elif child["type"] in UNBATCHED_TYPES:
+                await self.flush_batch(parent_id, batch, keys, pending)
+                batch, keys, pending, batch_size = [], [], [], 0
+                await self.materialize(parent_id, child)
+                continue
+            else:
+                payloads, deferred, size = compile_block(child)
+                child_keys = self.keys(child, len(payloads))
+
+            if batch and (len(batch) + len(payloads) > MAX_CHILDREN_PER_REQUEST or batch_size + size > MAX_BLOCKS_PER_REQUEST):
+                await self.flush_batch(parent_id, batch, keys, pending)
+                batch, keys, pending, batch_size = [], [], [], 0
+
+            for path, grandchildren in deferred:
+                pending.append(((len(batch),) + path, grandchildren))
+            batch.extend(payloads)
+            keys.extend(child_keys)
+            batch_size += size
+
+        await self.flush_batch(parent_id, batch, keys, pending)
+
+    async def flush_batch(self, parent_id, batch, keys, pending, after=None):
+        if not batch:
+            return []
+
+        # Blocks under a parent are created in order, so whatever an earlier run got to is a prefix of the batch.
+        block_ids = await self.recorded(parent_id, keys)
+        start = block_ids.index(None) if None in block_ids else len(batch)
+        results = [{"id": block_id} for block_id in block_ids[:start]]
+        if start < len(batch):
+            results.extend(await self.append_children(parent_id, batch[start:], keys[start:], after))
+        listings = {}
+        for path, grandchildren in pending:
+            block_id = await self.resolve_block_id(results, path, listings)
+            if self.journal is not None:
+                # Children created inline with their parent come first, so a resume can tell them from later appends.
+                inlined = nested_payload(batch, path)
+                count = len(inlined[inlined["type"]].get("children", []))
+                self.journal.intend(block_id, [f"{block_id}#{index}" for index in range(count)])
+            self.spawn(self.materialize_children(block_id, grandchildren))
+        return results
+
+    async def resolve_block_id(self, results, path, listings):
+        # The append response only describes first-level blocks, nested ones are found by listing their parent.
+        block_id = results[path[0]]["id"]
+        for index in path[1:]:
+            if block_id not in listings:
+                listings[block_id] = await self.list_children(block_id)
+            block_id = listings[block_id][index]["id"]
+        return block_id
+
+
+async def materialize_blueprint(parent_id, block_json, max_concurrency=MAX_CONCURRENCY, seed=None, journal=None):
+    # Resolve every cover up front so Unsplash latency stays off the page creation path.
+    covers = await asyncio.to_thread(prefetch_covers, collect_titles(block_json))
+    async with RateLimitedAsyncClient(auth=NOTION_KEY) as notion:
+        await Materializer(notion, max_concurrency, seed, covers, journal).run(parent_id, block_json)
@@ -0,0 +1,261 @@
+import contextvars
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = os.environ.get("NOTION_GPT_METRICS_PORT")
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+ID_PATTERN = re.compile(r"[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}")
+
+current_run = contextvars.ContextVar("current_run", default=None)
+# The call in flight, for clients that only see its response further down the stack.
+current_call = contextvars.ContextVar("current_call", default=None)
+
+
+class Call:
+    """What one API call sent and received. Filled in by whoever can see the request and response."""
+
+    def __init__(self, sent=0):
+        self.sent = sent
+        self.received = 0
+        self.status = 200
+
+
+class Stats:
+    def __init__(self, keep_samples):
+        self.statuses = Counter()
+        self.retries = 0
+        self.sent = 0
+        self.received = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.samples = [] if keep_samples else None
+
+    def add(self, status, seconds, sent, received, retry):
+        self.statuses[str(status)] += 1
+        self.retries += retry
+        self.sent += sent
+        self.received += received
+        self.seconds += seconds
+        self.buckets[next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))] += 1
+        if self.samples is not None:
+            self.samples.append(seconds)
+
+
+class Recorder:
+    """Counts, bytes, latency histograms, retries and 429s of the calls to Notion, OpenAI and Unsplash.
+
+    Calls are grouped by service, endpoint and block type. The process-wide ``registry`` is what ``render`` exposes
+    for scraping. ``collect`` starts a recorder for a single run, which also keeps every latency for its percentiles,
+    and sees the calls of the threads and event loops the run hands work to as long as they go through ``carry``.
+    """
+
+    def __init__(self, keep_samples=False, parent=None):
+        self.keep_samples = keep_samples
+        self.parent = parent
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.waited = Counter()
+
+    def record(self, key, status, seconds, sent, received, retry):
+        with self.lock:
+            if key not in self.stats:
+                self.stats[key] = Stats(self.keep_samples)
+            self.stats[key].add(status, seconds, sent, received, retry)
+
+    def record_wait(self, service, seconds):
+        with self.lock:
+            self.waited[service] += seconds
+
+    def summary(self):
+        """Per-endpoint totals and latency percentiles, slowest in total first, and the time spent rate limited."""
+        with self.lock:
+            calls = []
+            for (service, endpoint, block_type), stats in self.stats.items():
+                samples = sorted(stats.samples or [])
+                calls.append({
+                    "service": service,
+                    "endpoint": endpoint,
+                    "block_type": block_type,
+                    "calls": sum(stats.statuses.values()),
+                    "errors": sum(count for status, count in stats.statuses.items() if status != "200"),
+                    "retries": stats.retries,
+                    "throttled": stats.statuses.get("429", 0),
+                    "bytes_sent": stats.sent,
+                    "bytes_received": stats.received,
+                    "seconds": stats.seconds,
+                    "p50": percentile(samples, 0.5),
+                    "p95": percentile(samples, 0.95),
+                    "max": samples[-1] if samples else None,
+                })
+            return {
+                "seconds": time.time() - self.started,
+                "waited": dict(self.waited),
+                "calls": sorted(calls, key=lambda call: -call["seconds"]),
+            }
+
+    def render(self):
+        """The metrics in Prometheus' text exposition format."""
+        lines = []
+        with self.lock:
+            items = sorted(self.stats.items())
+            metrics = [
+                ("notion_gpt_api_calls_total", "counter", "Calls to external APIs, by response status.",
+                 [(labels(key, status=status), count) for key, stats in items for status, count in sorted(stats.statuses.items())]),
+                ("notion_gpt_api_retries_total", "counter", "Calls that were retries of a failed call.",
+                 [(labels(key), stats.retries) for key, stats in items]),
+                ("notion_gpt_api_sent_bytes_total", "counter", "Request body bytes sent.",
+                 [(labels(key), stats.sent) for key, stats in items]),
+                ("notion_gpt_api_received_bytes_total", "counter", "Response body bytes received.",
+                 [(labels(key), stats.received) for key, stats in items]),
+                ("notion_gpt_rate_limit_wait_seconds_total", "counter", "Time spent waiting for the client-side rate limit.",
+                 [(f'{{service="{service}"}}', seconds) for service, seconds in sorted(self.waited.items())]),
+            ]
+            for name, kind, description, samples in metrics:
+                lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{sample_labels} {value}" for sample_labels, value in samples]
+
+            name = "notion_gpt_api_latency_seconds"
+            lines += [f"# HELP {name} Latency of calls to external APIs.", f"# TYPE {name} histogram"]
+            for key, stats in items:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), stats.buckets):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{labels(key, le=bound)} {cumulative}")
+                lines.append(f"{name}_sum{labels(key)} {stats.seconds}")
+                lines.append(f"{name}_count{labels(key)} {sum(stats.buckets)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Recorder()
+
+
+def labels(key, **extra):
+    service, endpoint, block_type = key
+    pairs = {"service": service, "endpoint": endpoint, "block_type": block_type or "", **extra}
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs.items()) + "}"
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    return samples[max(0, math.ceil(fraction * len(samples)) - 1)]
+
+
+def recorders():
+    yield registry
+    run = current_run.get()
+    while run is not None:
+        yield run
+        run = run.parent
+
+
+def endpoint(method, path):
+    return f"{method} /{ID_PATTERN.sub('{id}', path.lstrip('/'))}"
+
+
+def error_status(error):
+    for value in (getattr(error, "status", None), getattr(error, "status_code", None),
+                  getattr(getattr(error, "response", None), "status_code", None)):
+        if isinstance(value, int):
+            return value
+    return type(error).__name__
+
+
+@contextmanager
+def measure(service, endpoint, block_type=None, sent=0, retry=False):
+    """Times the call made inside the block and records it, along with whatever it sets on the yielded ``Call``."""
+    call = Call(sent)
+    started = time.perf_counter()
+    try:
+        yield call
+    except Exception as e:
+        call.status = error_status(e)
+        raise
+    except BaseException:
+        # The caller stopped waiting, for example by closing a stream early.
+        call.status = "cancelled"
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        for recorder in recorders():
+            recorder.record((service, endpoint, block_type), call.status, seconds, call.sent, call.received, retry)
+
+
+def record_wait(service, seconds):
+    if seconds:
+        for recorder in recorders():
+            recorder.record_wait(service, seconds)
+
+
+@contextmanager
+def collect():
+    """Records the calls made inside the block, returning the run's ``Recorder``. Runs can be nested."""
+    run = Recorder(keep_samples=True, parent=current_run.get())
+    token = current_run.set(run)
+    try:
+        yield run
+    finally:
+        current_run.reset(token)
+
+
+def carry(target):
+    """Binds a coroutine or function to the current run, for handing it to another thread or event loop."""
+    run = current_run.get()
+    if hasattr(target, "__await__"):
+        async def bound_coroutine():
+            current_run.set(run)
+            return await target
+        return bound_coroutine()
+
+    def bound(*args, **kwargs):
+        token = current_run.set(run)
+        try:
+            return target(*args, **kwargs)
+        finally:
+            current_run.reset(token)
+    return bound
+
+
+def format_summary(summary):
+    lines = [f"{'service':<9}{'endpoint':<32}{'block type':<20}{'calls':>6}{'retries':>8}{'429s':>6}"
+             f"{'KB out':>8}{'KB in':>8}{'p50 ms':>8}{'p95 ms':>8}{'total s':>9}"]
+    for call in summary["calls"]:
+        p50 = f"{call['p50'] * 1e3:.0f}" if call["p50"] is not None else "-"
+        p95 = f"{call['p95'] * 1e3:.0f}" if call["p95"] is not None else "-"
+        lines.append(f"{call['service']:<9}{call['endpoint'][:31]:<32}{(call['block_type'] or '-')[:19]:<20}"
+                     f"{call['calls']:>6}{call['retries']:>8}{call['throttled']:>6}{call['bytes_sent'] / 1024:>8.1f}"
+                     f"{call['bytes_received'] / 1024:>8.1f}{p50:>8}{p95:>8}{call['seconds']:>9.2f}")
+    for service, seconds in sorted(summary["waited"].items()):
+        lines.append(f"Waited {seconds:.1f}s for the {service} rate limit.")
+    lines.append(f"Run took {summary['seconds']:.1f}s.")
+    return "\n".join(lines)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        data = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port=METRICS_PORT):
+    """Serves ``registry`` for Prometheus to scrape on ``port``, if one is set, from a background thread."""
+    if not port:
+        return None
+    server = ThreadingHTTPServer(("0.0.0.0", int(port)), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
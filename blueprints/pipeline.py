@@ -0,0 +1,151 @@
+import asyncio
+import copy
+import os
+import threading
+
+from . import metrics
+from .jsonstream import BlueprintStarted, ChildCompleted
+from .materializer import MAX_CONCURRENCY, Materializer, collect_titles, materialize_blueprint
+from .ratelimit import RateLimitedAsyncClient
+from .repair import validate_child
+
+NOTION_KEY = os.environ["NOTION_KEY"]
+
+
+class BlueprintPipeline:
+    """Materializes a blueprint while the model is still generating it.
+
+    Hand it the events of a ``BlueprintStreamParser`` as the completion streams in. As soon as the root page's header is known the page is created,
+    and each top-level child is handed to a background materializer the moment it is complete and valid, so
+    Notion writes overlap with generation. Once the full blueprint is known, ``finish`` materializes whatever was
+    not streamed (everything after the first invalid child, if any) and waits for the writes to complete. If the
+    blueprint was repaired in a way that changed children already written, the partial page is archived and the
+    blueprint is materialized from scratch. ``abort`` stops early and archives the partially built page.
+
+    With a ``journal``, everything written is recorded in it. Once the final response has been saved to the journal,
+    a failure leaves the partial page in place instead of archiving it, for a later attempt to resume.
+    """
+
+    def __init__(self, parent_id, max_concurrency=MAX_CONCURRENCY, seed=None, journal=None):
+        self.parent_id = parent_id
+        self.max_concurrency = max_concurrency
+        self.seed = seed
+        self.journal = journal
+        self.queue = asyncio.Queue()
+        self.streamed = []
+        self.stopped = False
+        self.aborted = False
+        self.future = None
+        self.task = None
+        self.root_id = None
+        self.closed = False
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            if self.journal is not None and self.journal.load() is not None:
+                self.stop()
+            else:
+                self.abort()
+        self.close()
+
+    def handle(self, event):
+        if isinstance(event, BlueprintStarted):
+            self.future = asyncio.run_coroutine_threadsafe(metrics.carry(self.run(event.header)), self.loop)
+        elif isinstance(event, ChildCompleted) and not self.stopped:
+            # Children are only streamed in order, so the first invalid one stops streaming for good.
+            if self.future is None or event.index != len(self.streamed) or not is_valid_child(event.child):
+                self.stopped = True
+                return
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, (len(self.streamed), event.child))
+            self.streamed.append(copy.deepcopy(event.child))
+
+    def finish(self, blueprint):
+        children = blueprint.get("children", [])
+        if self.future is not None and children[:len(self.streamed)] != self.streamed:
+            # A repair rewrote children that are already in Notion, so start over rather than patch them.
+            self.abort()
+            self.future = None
+
+        if self.future is None:
+            asyncio.run_coroutine_threadsafe(
+                metrics.carry(materialize_blueprint(self.parent_id, blueprint, self.max_concurrency, self.seed, self.journal)),
+                self.loop
+            ).result()
+            return
+
+        for index, child in enumerate(children[len(self.streamed):], len(self.streamed)):
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, (index, child))
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+        self.future.result()
+
+    def abort(self):
+        self.aborted = True
+        self.stop()
+        if self.journal is not None:
+            # The page is archived, so nothing recorded so far is worth resuming.
+            self.journal.discard()
+
+    def stop(self):
+        if self.future is not None and not self.future.done():
+            asyncio.run_coroutine_threadsafe(self.cancel(), self.loop).result()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+
+    async def cancel(self):
+        self.task.cancel()
+        try:
+            await self.task
+        except BaseException:
+            pass
+
+    async def run(self, header):
+        self.task = asyncio.current_task()
+        async with RateLimitedAsyncClient(auth=NOTION_KEY) as notion:
+            materializer = Materializer(notion, self.max_concurrency, self.seed, journal=self.journal)
+            materializer.track(header)
+            # Shielded, so an abort that lands while the root page is being created still gets to archive it.
+            root_task = asyncio.ensure_future(materializer.create_page(self.parent_id, header))
+            try:
+                self.root_id = await asyncio.shield(root_task)
+                finished = False
+                while not finished:
+                    # Drain everything that arrived while the previous batch was being written, so streamed
+                    # children still share appends.
+                    items = [await self.queue.get()]
+                    while not self.queue.empty():
+                        items.append(self.queue.get_nowait())
+                    if items[-1] is None:
+                        finished = True
+                        items.pop()
+                    for index, child in items:
+                        materializer.track(child, str(index))
+                    children = [child for _, child in items]
+                    materializer.prefetch([title for child in children for title in collect_titles(child)])
+                    await materializer.materialize_children(self.root_id, children)
+                await materializer.join()
+            except BaseException:
+                for task in materializer.tasks:
+                    task.cancel()
+                if not self.aborted:
+                    root_task.cancel()
+                    raise
+                await asyncio.wait([root_task])
+                if not root_task.cancelled() and root_task.exception() is None:
+                    self.root_id = root_task.result()
+                    await notion.pages.update(page_id=self.root_id, archived=True)
+                raise
+
+
+def is_valid_child(child):
+    return validate_child(child) is None
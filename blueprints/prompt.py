@@ -0,0 +1,206 @@
+"""Builds the messages sent to the model.
+
+The system prompt describes the blueprint format in a compact notation rendered from the pydantic models in
+``schema.py``, so the prompt can never drift from the validation it is checked against. The system prompt and the
+few-shot examples form a prefix that is byte-identical across requests, which lets providers cache it; everything
+request-specific goes after it. Run ``python -m blueprints.prompt`` for a token count report.
+"""
+import csv
+import hashlib
+import inspect
+import json
+import os
+from enum import Enum
+from functools import lru_cache
+from typing import Annotated, Dict, List, Literal, Union, get_args, get_origin
+
+from pydantic import BaseModel, RootModel
+
+from . import schema
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+EXAMPLES_PATH = os.path.join(DATA_DIR, "example_blueprints.csv")
+PROMPT_VERSION = "v13"
+# A fine-tuned model is served the prompt it was trained on. After retraining on the current prompt, set
+# NOTION_GPT_PROMPT_VERSION to PROMPT_VERSION along with the new model's name.
+FINE_TUNED_MODEL = os.environ.get("NOTION_GPT_MODEL_NAME")
+FINE_TUNED_PROMPT_VERSION = os.environ.get("NOTION_GPT_PROMPT_VERSION", "v12")
+FEW_SHOT_PROMPTS = (
+    "I'm the CEO of Acme Inc.",
+    "I run a CS club",
+)
+
+PREAMBLE = "You are NotionGPT, a state-of-the-art template designer for Notion, programmed to create custom JSON blueprints that represent detailed, organized, and highly functional Notion templates. Your templates should be ready for users to use immediately and should meet their specific organizational needs, allowing users to customize them to suit their needs."
+
+NOTATION = "Respond ONLY with valid json conforming to OpenAIResponse below. Notation: Name{field:type} is an object, field? is optional, [T] is a list of T, {K:V} is an object mapping K to V, A|B is either, \"x\" is a literal string, Name=a|b lists allowed string values."
+
+RULES = (
+    "A PropertySchema with type number requires format.",
+    "A PropertySchema with type select or multi_select requires options.",
+    "A DatabaseSchema has exactly one property with type title.",
+    "The root Page (blueprint) must have more than one child. DO NOT JUST GENERATE A SINGULAR CALLOUT BOX IN A PAGE AS YOUR BLUEPRINT.",
+)
+
+INSTRUCTIONS = "Do not include any additional text other than the object json as we will load this object with json.loads() and pydantic. Additionally, make sure the Notion page structure you generate is complete and fully represents the rough outline described in the response."
+
+
+def type_name(annotation):
+    origin = get_origin(annotation)
+    args = get_args(annotation)
+
+    if origin is Annotated:
+        return type_name(args[0])
+    if origin is Union:
+        return "|".join(type_name(arg) for arg in args if arg is not type(None))
+    if origin is Literal:
+        return "|".join(json.dumps(arg) for arg in args)
+    if origin in (list, List):
+        return f"[{type_name(args[0])}]"
+    if origin in (dict, Dict):
+        return f"{{{type_name(args[0])}:{type_name(args[1])}}}"
+    return getattr(annotation, "__name__", str(annotation))
+
+
+def referenced_types(annotation):
+    origin = get_origin(annotation)
+    if origin is not None:
+        for arg in get_args(annotation):
+            yield from referenced_types(arg)
+    elif isinstance(annotation, type) and issubclass(annotation, (BaseModel, Enum)):
+        yield annotation
+
+
+def collect_types(root):
+    seen = []
+    pending = [root]
+    while pending:
+        model = pending.pop()
+        if model in seen:
+            continue
+        seen.append(model)
+        if issubclass(model, BaseModel):
+            for field in model.model_fields.values():
+                pending.extend(referenced_types(field.annotation))
+    # Keep the order the types are declared in schema.py, so the rendering is stable.
+    declared = [value for value in vars(schema).values() if isinstance(value, type)]
+    return [value for value in declared if value in seen]
+
+
+def render_type(model):
+    if issubclass(model, Enum):
+        return f"{model.__name__}={'|'.join(member.value for member in model)}"
+    if issubclass(model, RootModel):
+        return f"{model.__name__}={type_name(model.model_fields['root'].annotation)}"
+
+    fields = []
+    for name, field in model.model_fields.items():
+        fields.append(f"{field.alias or name}{'' if field.is_required() else '?'}:{type_name(field.annotation)}")
+    return f"{model.__name__}{{{','.join(fields)}}}"
+
+
+@lru_cache(maxsize=None)
+def render_schema(root=schema.OpenAIResponse):
+    return "\n".join(render_type(model) for model in collect_types(root))
+
+
+def training_data_path(version=PROMPT_VERSION):
+    return os.path.join(DATA_DIR, f"finetuning_data_cot_{version}.jsonl")
+
+
+def prompt_version(model_name):
+    return FINE_TUNED_PROMPT_VERSION if model_name == FINE_TUNED_MODEL else PROMPT_VERSION
+
+
+@lru_cache(maxsize=None)
+def system_prompt(version=PROMPT_VERSION):
+    if version != PROMPT_VERSION:
+        # Earlier prompts are kept verbatim in the training data of the models that were fine-tuned on them.
+        with open(training_data_path(version), encoding="utf-8") as file:
+            return json.loads(file.readline())["messages"][0]["content"]
+    rules = "\n".join(f"- {rule}" for rule in RULES)
+    return f"{PREAMBLE}\n\n{NOTATION}\n\n{render_schema()}\n\nRules:\n{rules}\n\n{INSTRUCTIONS}"
+
+
+def serialize_response(response, blueprint):
+    return json.dumps({"response": response, "blueprint": blueprint}, ensure_ascii=False, separators=(",", ":"))
+
+
+@lru_cache(maxsize=None)
+def few_shot_examples():
+    with open(EXAMPLES_PATH, encoding="utf-8-sig") as file:
+        rows = list(csv.DictReader(file))
+
+    examples = []
+    for prefix in FEW_SHOT_PROMPTS:
+        row = next(row for row in rows if row["Prompt"].startswith(prefix))
+        examples.append((row["Prompt"], serialize_response(row["Response"], json.loads(row["Blueprint"]))))
+    return tuple(examples)
+
+
+def prefix_messages(few_shot=True, version=PROMPT_VERSION):
+    messages = [{"role": "system", "content": system_prompt(version)}]
+    if few_shot:
+        for prompt, response in few_shot_examples():
+            messages.append({"role": "user", "content": prompt})
+            messages.append({"role": "assistant", "content": response})
+    return messages
+
+
+def build_messages(description, error=None, failed_response=None, few_shot=True, version=PROMPT_VERSION):
+    messages = prefix_messages(few_shot, version)
+    messages.append({"role": "user", "content": description})
+    if error and failed_response:
+        messages.append({"role": "assistant", "content": failed_response})
+        messages.append({
+            "role": "user",
+            "content": f"While processing your response with Pydantic, I encountered the following error: {error}. Please edit your previous response to correct the error following the exact same format."
+        })
+    return messages
+
+
+def build_repair_messages(block, errors, few_shot=True, version=PROMPT_VERSION):
+    messages = prefix_messages(few_shot, version)
+    messages.append({
+        "role": "user",
+        "content": f"This block from one of your blueprints failed validation with Pydantic: {'; '.join(errors)}. Respond ONLY with the corrected block as json, keeping its content and following the exact same format.\n{json.dumps(block, ensure_ascii=False, separators=(',', ':'))}"
+    })
+    return messages
+
+
+def count_tokens(text, model_name="gpt-4o"):
+    try:
+        import tiktoken
+    except ImportError:
+        # Roughly four characters per token for English text and JSON.
+        return (len(text) + 3) // 4, False
+    try:
+        encoding = tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return len(encoding.encode(text)), True
+
+
+def token_report(model_name="gpt-4o"):
+    legacy = inspect.getsource(schema).replace("    ", "\t")
+    prefix = json.dumps(prefix_messages(), ensure_ascii=False, separators=(",", ":"))
+    sections = [
+        ("schema as python source (before)", legacy),
+        ("schema in compact notation", render_schema()),
+        ("system prompt", system_prompt()),
+        ("few-shot examples", "".join(prompt + response for prompt, response in few_shot_examples())),
+        ("cacheable prefix", prefix),
+    ]
+
+    lines = []
+    exact = True
+    for name, text in sections:
+        tokens, exact = count_tokens(text, model_name)
+        lines.append(f"{name:<34}{tokens:>7} tokens {len(text):>8} chars")
+    if not exact:
+        lines.append("(install tiktoken for exact counts, these are estimates)")
+    lines.append(f"prefix sha256: {hashlib.sha256(prefix.encode()).hexdigest()[:16]}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    print(token_report())
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+import httpx
+from notion_client import Client, AsyncClient
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+from . import metrics
+
+NOTION_RATE_LIMIT = float(os.environ.get("NOTION_RATE_LIMIT", 3))
+NOTION_BURST = int(os.environ.get("NOTION_BURST", 3))
+MAX_RETRIES = 5
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter:
+    """Process-wide token bucket shared by every Notion client.
+
+    Each caller reserves the next free slot and sleeps until it comes up, so requests leave in arrival order at
+    ``rate`` per second with bursts of up to ``burst``. A ``Retry-After`` from the API pauses the whole bucket.
+    """
+
+    def __init__(self, rate=NOTION_RATE_LIMIT, burst=NOTION_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.next_slot = 0.0
+        self.waiting = 0
+        self.lock = threading.Lock()
+
+    @property
+    def queue_depth(self):
+        return self.waiting
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now - (self.burst - 1) / self.rate)
+            self.next_slot = slot + 1 / self.rate
+            return max(0.0, slot - now)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.next_slot = max(self.next_slot, time.monotonic() + seconds)
+
+    def acquire(self):
+        delay = self.reserve()
+        metrics.record_wait("notion", delay)
+        if delay:
+            with self.lock:
+                self.waiting += 1
+            try:
+                time.sleep(delay)
+            finally:
+                with self.lock:
+                    self.waiting -= 1
+
+    async def acquire_async(self):
+        delay = self.reserve()
+        metrics.record_wait("notion", delay)
+        if delay:
+            with self.lock:
+                self.waiting += 1
+            try:
+                await asyncio.sleep(delay)
+            finally:
+                with self.lock:
+                    self.waiting -= 1
+
+
+limiter = RateLimiter()
+
+
+def backoff_delay(attempt, base=0.5, cap=30.0):
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def is_idempotent(method, path):
+    """Whether repeating the call cannot apply it twice. Creating pages or databases and appending blocks can."""
+    if method == "POST":
+        return path == "search" or path.endswith("/query")
+    if method == "PATCH":
+        return not path.endswith("/children")
+    return True
+
+
+def never_sent(error):
+    """Whether the request failed before it reached Notion, so Notion cannot have applied it."""
+    # The clients turn timeouts into a RequestTimeoutError raised while handling httpx's own exception.
+    cause = error.__context__ if isinstance(error, RequestTimeoutError) else error
+    return isinstance(cause, (httpx.ConnectError, httpx.ConnectTimeout))
+
+
+def retry_delay(error, attempt, idempotent=True):
+    if not idempotent and not never_sent(error) and not (isinstance(error, HTTPResponseError) and error.status == 429):
+        # The write may have been applied before it failed, so it is left for the journal or the caller to settle.
+        return None
+    if isinstance(error, (RequestTimeoutError, httpx.TimeoutException, httpx.NetworkError)):
+        return backoff_delay(attempt)
+    if not isinstance(error, HTTPResponseError) or error.status not in RETRYABLE_STATUSES:
+        return None
+
+    retry_after = error.headers.get("retry-after")
+    if retry_after is not None:
+        try:
+            seconds = float(retry_after)
+        except ValueError:
+            return backoff_delay(attempt)
+        limiter.pause(seconds)
+        return seconds + random.uniform(0, 1 / limiter.rate)
+    return backoff_delay(attempt)
+
+
+def block_type(path, body):
+    """What a call writes, for grouping its metrics: the page, database or types of blocks it creates."""
+    if path == "pages":
+        return "page"
+    if path == "databases":
+        return "database"
+    if path.endswith("/children") and body and body.get("children"):
+        types = sorted({child["type"] for child in body["children"]})
+        return types[0] if len(types) == 1 else "mixed"
+    return None
+
+
+def measure_response(response):
+    call = metrics.current_call.get()
+    if call is not None:
+        call.sent = len(response.request.content)
+        call.received = len(response.content)
+
+
+class RateLimitedClient(Client):
+    def request(self, path, method, query=None, body=None, auth=None):
+        idempotent = is_idempotent(method, path)
+        for attempt in range(MAX_RETRIES + 1):
+            limiter.acquire()
+            try:
+                with metrics.measure("notion", metrics.endpoint(method, path), block_type(path, body), retry=attempt > 0) as call:
+                    token = metrics.current_call.set(call)
+                    try:
+                        return super().request(path, method, query, body, auth)
+                    finally:
+                        metrics.current_call.reset(token)
+            except Exception as e:
+                delay = retry_delay(e, attempt, idempotent)
+                if delay is None or attempt == MAX_RETRIES:
+                    raise
+                time.sleep(delay)
+
+    def _parse_response(self, response):
+        measure_response(response)
+        return super()._parse_response(response)
+
+
+class RateLimitedAsyncClient(AsyncClient):
+    async def request(self, path, method, query=None, body=None, auth=None):
+        idempotent = is_idempotent(method, path)
+        for attempt in range(MAX_RETRIES + 1):
+            await limiter.acquire_async()
+            try:
+                with metrics.measure("notion", metrics.endpoint(method, path), block_type(path, body), retry=attempt > 0) as call:
+                    token = metrics.current_call.set(call)
+                    try:
+                        return await super().request(path, method, query, body, auth)
+                    finally:
+                        metrics.current_call.reset(token)
+            except Exception as e:
+                delay = retry_delay(e, attempt, idempotent)
+                if delay is None or attempt == MAX_RETRIES:
+                    raise
+                await asyncio.sleep(delay)
+
+    def _parse_response(self, response):
+        measure_response(response)
+        return super()._parse_response(response)
@@ -0,0 +1,285 @@
+import copy
+import re
+
+from pydantic import TypeAdapter, ValidationError
+
+from .schema import BackgroundColor, Color, NumberFormat, OpenAIResponse, PageChild, PropertyType, TextStyle
+
+MAX_PASSES = 5
+
+HEADING_TYPES = ("heading_1", "heading_2", "heading_3")
+RICH_TEXT_TYPES = ("paragraph", "callout", "quote")
+PROPERTY_TYPE_ALIASES = {
+    "text": "rich_text",
+    "string": "rich_text",
+    "multiselect": "multi_select",
+    "phone": "phone_number",
+    "person": "people",
+    "user": "people",
+    "file": "files",
+    "link": "url",
+    "boolean": "checkbox",
+    "datetime": "date"
+}
+DEFAULT_CALLOUT_ICON = "💡"
+
+COLORS = {color.value for color in Color}
+BACKGROUND_COLORS = {color.value for color in BackgroundColor}
+NUMBER_FORMATS = {number_format.value for number_format in NumberFormat}
+PROPERTY_TYPES = {property_type.value for property_type in PropertyType}
+TEXT_STYLES = {style.value for style in TextStyle}
+
+page_child = TypeAdapter(PageChild)
+
+
+class InvalidResponse(Exception):
+    """A response that still fails validation after repair."""
+
+    def __init__(self, content, error):
+        super().__init__(str(error))
+        self.content = content
+        self.error = error
+
+
+def validate(content):
+    try:
+        OpenAIResponse.model_validate(content)
+    except ValidationError as e:
+        return e
+    return None
+
+
+def validate_child(child):
+    try:
+        page_child.validate_python(child)
+    except ValidationError as e:
+        return e
+    return None
+
+
+def locate(content, loc):
+    """Follows an error location into ``content`` to the innermost block it passes through.
+
+    Returns the path to that block and the rest of the location below it. Locations also name the union member that
+    was tried (``"toggle"``, ``"Paragraph"``), those segments are skipped. A ``None`` path means the error is about
+    the response as a whole rather than a block.
+    """
+    node = content
+    path = []
+    block_path = None
+    rest = tuple(loc)
+    for position, key in enumerate(loc):
+        if isinstance(node, dict) and key in node:
+            node = node[key]
+        elif isinstance(node, list) and isinstance(key, int) and key < len(node):
+            node = node[key]
+        else:
+            continue
+        path.append(key)
+        if isinstance(node, dict) and "type" in node:
+            block_path = tuple(path)
+            rest = tuple(loc[position + 1:])
+    if block_path == ("blueprint",):
+        return None, tuple(loc)
+    return block_path, rest
+
+
+def resolve(content, path):
+    for key in path:
+        content = content[key]
+    return content
+
+
+def assign(content, path, value):
+    resolve(content, path[:-1])[path[-1]] = value
+
+
+def plain_text(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return plain_text(value.get("text", ""))
+    if isinstance(value, list):
+        return "".join(plain_text(item) for item in value)
+    return str(value)
+
+
+def fix_rich_text(content):
+    if isinstance(content, (str, dict)):
+        content = [content]
+    fixed = []
+    for item in content if isinstance(content, list) else []:
+        if isinstance(item, str):
+            item = {"text": item}
+        elif isinstance(item, dict):
+            item = dict(item)
+            item["text"] = plain_text(item.get("text", item.get("content", "")))
+            item.pop("content", None)
+            style = item.get("style", [])
+            style = [style] if isinstance(style, str) else style
+            item["style"] = [value for value in style if value in TEXT_STYLES] if isinstance(style, list) else []
+        else:
+            continue
+        fixed.append(item)
+    return fixed
+
+
+def background_color(color):
+    if color in BACKGROUND_COLORS:
+        return color
+    if f"{color}_background" in BackgroundColor.__members__:
+        return BackgroundColor[f"{color}_background"].value
+    return "default"
+
+
+def fix_schema(schema):
+    fixed = {}
+    for name, prop in schema.items():
+        if isinstance(prop, str):
+            prop = {"type": prop}
+        if not isinstance(prop, dict):
+            continue
+        prop = dict(prop)
+        prop_type = PROPERTY_TYPE_ALIASES.get(prop.get("type"), prop.get("type"))
+        prop["type"] = prop_type if prop_type in PROPERTY_TYPES else "rich_text"
+
+        if prop["type"] == "number" and prop.get("format") not in NUMBER_FORMATS:
+            prop["format"] = "number"
+        elif prop["type"] != "number":
+            prop.pop("format", None)
+
+        if prop["type"] in ("select", "multi_select"):
+            options = []
+            for option in prop.get("options") or []:
+                if isinstance(option, str):
+                    option = {"name": option}
+                if isinstance(option, dict) and option.get("name"):
+                    options.append({"name": str(option["name"]), "color": option.get("color") if option.get("color") in COLORS else "default"})
+            if options:
+                prop["options"] = options
+            else:
+                # There is nothing to invent options from, free text keeps the column usable.
+                prop["type"] = "rich_text"
+                prop.pop("options", None)
+        else:
+            prop.pop("options", None)
+        fixed[name] = prop
+
+    titles = [name for name, prop in fixed.items() if prop["type"] == "title"]
+    for name in titles[1:]:
+        fixed[name]["type"] = "rich_text"
+    if not titles:
+        name = next((name for name, prop in fixed.items() if prop["type"] == "rich_text"), None)
+        if name is not None:
+            fixed[name]["type"] = "title"
+        else:
+            fixed = {"Name": {"type": "title"}, **fixed}
+    return fixed
+
+
+def fix_block(block):
+    block_type = block.get("type")
+
+    if isinstance(block_type, str) and re.fullmatch(r"heading_\d", block_type) and block_type not in HEADING_TYPES:
+        block["type"] = block_type = "heading_3" if int(block_type[8:]) > 3 else "heading_1"
+
+    if block_type in HEADING_TYPES + ("toggle",) and not isinstance(block.get("text"), str):
+        # Toggles in the curated examples are written with "title", so the model often repeats it.
+        block["text"] = plain_text(block.pop("title", None) or block.pop("content", None) or block.get("text") or "")
+
+    if block_type == "toggle" and not isinstance(block.get("children"), list):
+        block["children"] = []
+
+    if block_type in RICH_TEXT_TYPES:
+        block["content"] = fix_rich_text(block.get("content", block.pop("text", "")))
+
+    if block_type == "callout":
+        block["color"] = background_color(block.get("color"))
+        if not isinstance(block.get("icon"), str) or not block["icon"]:
+            block["icon"] = DEFAULT_CALLOUT_ICON
+
+    if block_type in ("bulleted_list", "numbered_list"):
+        block["items"] = [plain_text(item) for item in block.get("items", [])]
+
+    if block_type == "to_do_list":
+        items = []
+        for item in block.get("items", []):
+            if isinstance(item, dict):
+                items.append({"text": plain_text(item.get("text", "")), "checked": bool(item.get("checked", False))})
+            else:
+                items.append({"text": plain_text(item), "checked": False})
+        block["items"] = items
+
+    if block_type == "database" and isinstance(block.get("schema"), dict):
+        block["schema"] = fix_schema(block["schema"])
+
+    if block_type == "page" and not isinstance(block.get("children"), list):
+        block["children"] = []
+
+
+def unwrap(block):
+    """Splits a container into a block of its own and the children it held, for a root page with one child."""
+    children = block.get("children") or []
+    if block.get("type") == "column_list":
+        return [child for column in block.get("columns", []) for child in column.get("children", [])]
+    if block.get("type") in ("page", "toggle"):
+        return [{"type": "heading_2", "text": block.get("title") or block.get("text", "")}] + children
+    if block.get("type") in ("callout", "quote") and children:
+        return [{key: value for key, value in block.items() if key != "children"}] + children
+    return [block]
+
+
+def fix_root(content):
+    if not isinstance(content.get("response"), str):
+        content["response"] = plain_text(content.get("response", ""))
+    blueprint = content.get("blueprint")
+    if isinstance(blueprint, dict) and isinstance(blueprint.get("children"), list) and len(blueprint["children"]) == 1:
+        blueprint["children"] = unwrap(blueprint["children"][0])
+
+
+def repair_locally(content, validator=validate, fix_top=fix_root):
+    """Fixes the mechanical mistakes the model makes, following the locations of the validation errors.
+
+    Returns the repaired copy of ``content`` and the ``ValidationError`` that is left, or ``None`` once it is valid.
+    Errors about ``content`` as a whole are handed to ``fix_top``.
+    """
+    content = copy.deepcopy(content)
+    error = validator(content)
+    for _ in range(MAX_PASSES):
+        if error is None or not isinstance(content, dict):
+            break
+        paths = {locate(content, details["loc"])[0] for details in error.errors()}
+        before = copy.deepcopy(content)
+        for path in paths:
+            if path is None:
+                fix_top(content)
+            else:
+                fix_block(resolve(content, path))
+        if content == before:
+            break
+        error = validator(content)
+    return content, error
+
+
+def repair_child(child):
+    return repair_locally(child, validate_child, fix_block)
+
+
+def failing_subtrees(content, error):
+    """Groups what is left of a validation error by the outermost blocks it is about.
+
+    Returns ``(path, messages)`` pairs, or ``None`` when an error concerns the response as a whole, in which case
+    only a full regeneration can fix it.
+    """
+    located = [(*locate(content, details["loc"]), details["msg"]) for details in error.errors()]
+    if any(path is None for path, _, _ in located):
+        return None
+
+    paths = {path for path, _, _ in located}
+    outermost = [path for path in paths if not any(other != path and path[:len(other)] == other for other in paths)]
+    subtrees = {path: set() for path in outermost}
+    for path, rest, message in located:
+        root = next(root for root in outermost if path[:len(root)] == root)
+        relative = ".".join(str(key) for key in path[len(root):] + rest)
+        subtrees[root].add(f"{relative or 'block'}: {message}")
+    return [(path, sorted(messages)) for path, messages in subtrees.items()]
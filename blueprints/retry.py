@@ -0,0 +1,108 @@
+import threading
+import time
+from typing import NamedTuple, Optional
+
+import httpx
+import openai
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+from .journal import ownership
+from .ratelimit import RETRYABLE_STATUSES, backoff_delay
+from .repair import InvalidResponse
+
+MAX_ATTEMPTS = 3
+BACKOFF_BASE = 2.0
+BACKOFF_CAP = 30.0
+WAIT_TICK = 1.0
+
+TRANSIENT_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    RequestTimeoutError,
+    httpx.TimeoutException,
+    httpx.NetworkError
+)
+
+
+class Attempt(NamedTuple):
+    number: int
+    duration: float
+    error: Optional[BaseException]
+    delay: Optional[float]
+
+    @property
+    def succeeded(self):
+        return self.error is None
+
+    @property
+    def retryable(self):
+        return self.delay is not None
+
+
+class Retrying(NamedTuple):
+    attempt: Attempt
+    max_attempts: int
+
+
+class Waiting(NamedTuple):
+    attempt: Attempt
+    remaining: float
+
+
+def retry_delay(error, attempt):
+    """How long to wait before trying again after ``error``, or ``None`` if retrying cannot help."""
+    if isinstance(error, InvalidResponse):
+        # The next attempt asks the model to fix its response, there is no server to back off from.
+        return 0.0
+    if isinstance(error, openai.RateLimitError):
+        if getattr(error, "code", None) == "insufficient_quota":
+            return None
+        retry_after = error.response.headers.get("retry-after")
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return backoff_delay(attempt, BACKOFF_BASE, BACKOFF_CAP)
+    if isinstance(error, TRANSIENT_ERRORS):
+        return backoff_delay(attempt, BACKOFF_BASE, BACKOFF_CAP)
+    if isinstance(error, HTTPResponseError) and error.status in RETRYABLE_STATUSES:
+        # The Notion clients already retried this request, so give the API a longer break before starting over.
+        return backoff_delay(attempt, BACKOFF_BASE, BACKOFF_CAP)
+    return None
+
+
+def run_with_retries(run_attempt, max_attempts=MAX_ATTEMPTS, on_attempt=None, cancelled=None):
+    """Runs ``run_attempt`` until it succeeds or the attempt budget is spent, passing its updates through.
+
+    ``run_attempt`` is called with the previous ``Attempt`` (``None`` the first time) and the journal owner shared by
+    all attempts of this run, and returns a generator of updates. A failed attempt that is worth retrying yields
+    ``Retrying``, then ``Waiting`` about every ``WAIT_TICK`` seconds of the backoff, so callers can report it and
+    closing the generator stops the wait. Setting the ``cancelled`` event ends the wait early and raises the error.
+    Fatal errors and the error of the last attempt are raised. ``on_attempt`` receives every ``Attempt``.
+    """
+    cancelled = cancelled or threading.Event()
+    previous = None
+    with ownership() as owner:
+        for number in range(1, max_attempts + 1):
+            start = time.monotonic()
+            try:
+                yield from run_attempt(previous, owner)
+            except Exception as e:
+                delay = retry_delay(e, number - 1)
+                previous = Attempt(number, time.monotonic() - start, e, delay)
+                if on_attempt is not None:
+                    on_attempt(previous)
+                if delay is None or number == max_attempts:
+                    raise
+                yield Retrying(previous, max_attempts)
+                deadline = time.monotonic() + delay
+                remaining = delay
+                while remaining > 0:
+                    yield Waiting(previous, remaining)
+                    if cancelled.wait(min(remaining, WAIT_TICK)):
+                        raise
+                    remaining = deadline - time.monotonic()
+            else:
+                if on_attempt is not None:
+                    on_attempt(Attempt(number, time.monotonic() - start, None, None))
+                return
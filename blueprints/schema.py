@@ -219,14 +219,18 @@ class Database(BaseModel):
     title: str
     icon: str
     is_inline: Optional[bool] = False
-    schema: DatabaseSchema
+    # Aliased because a field named schema would shadow BaseModel.schema and silently become optional.
+    database_schema: DatabaseSchema = Field(alias="schema")
 
 
 class Page(BaseModel):
     type: Literal["page"]
     title: str
 
-    children: List[Annotated[Union[Divider, TableOfContents, Heading, Paragraph, ListBlock, ToDoList, Toggle, ColumnList, Callout, Quote, Database, Page], Field(discriminator="type")]]
+    children: List[PageChild]
+
+
+PageChild = Annotated[Union[Divider, TableOfContents, Heading, Paragraph, ListBlock, ToDoList, Toggle, ColumnList, Callout, Quote, Database, Page], Field(discriminator="type")]
 
 
 class OpenAIResponse(BaseModel):
@@ -0,0 +1,190 @@
+import argparse
+import copy
+import csv
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import NamedTuple
+
+import numpy as np
+
+from .diskcache import cache_path
+from .prompt import EXAMPLES_PATH
+from .repair import repair_locally
+from .text import STOPWORDS
+
+TEMPLATE_THRESHOLD = float(os.environ.get("NOTION_GPT_TEMPLATE_THRESHOLD", "0.4"))
+MIN_SHARED_WORDS = 2
+INDEX_VERSION = 2
+
+SUFFIXES = (("ies", "y"), ("ing", ""), ("ers", ""), ("er", ""), ("ed", ""), ("s", ""))
+
+
+class Template(NamedTuple):
+    prompt: str
+    category: str
+    response: str
+    blueprint: dict
+
+
+def stem(word):
+    for suffix, replacement in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith("ss"):
+            return word[:-len(suffix)] + replacement
+    return word
+
+
+# Words that say what kind of page is wanted rather than what it is about, stemmed like the index terms.
+GENERIC_WORDS = frozenset(stem(word) for word in """
+basic build comprehensive create dashboard detailed easy keep list log manage organize place plan planner setup simple
+store system template track tracker
+""".split())
+
+
+def tokenize(text):
+    words = [stem(word) for word in re.findall(r"[a-z0-9']+", text.lower()) if word not in STOPWORDS]
+    # Bigrams reward phrases such as "habit track" over the same words scattered through a prompt.
+    return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+
+def term_weights(tokens):
+    return {term: 1 + math.log(count) for term, count in Counter(tokens).items()}
+
+
+def load_templates(examples_path):
+    templates = []
+    with open(examples_path, encoding="utf-8-sig") as file:
+        for row in csv.DictReader(file):
+            content, error = repair_locally({"response": row["Response"], "blueprint": json.loads(row["Blueprint"])})
+            if error is not None:
+                # Only blueprints that would be accepted from the model are worth handing out.
+                continue
+            templates.append(Template(row["Prompt"], row["Category"], row["Response"], content["blueprint"]))
+    return templates
+
+
+def build_index(examples_path, index_path):
+    templates = load_templates(examples_path)
+    documents = [term_weights(tokenize(template.prompt)) for template in templates]
+
+    frequencies = Counter(term for document in documents for term in document)
+    vocabulary = sorted(frequencies)
+    columns = {term: column for column, term in enumerate(vocabulary)}
+    idf = [math.log((1 + len(documents)) / (1 + frequencies[term])) + 1 for term in vocabulary]
+
+    matrix = np.zeros((len(documents), len(vocabulary)), dtype=np.float32)
+    for row, document in enumerate(documents):
+        for term, weight in document.items():
+            matrix[row, columns[term]] = weight * idf[columns[term]]
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+
+    # The metadata goes last, so a half-written index is never mistaken for a complete one.
+    np.save(f"{index_path}.npy", matrix)
+    with open(f"{index_path}.json.tmp", "w", encoding="utf-8") as file:
+        json.dump({"vocabulary": vocabulary, "idf": idf, "templates": templates}, file, ensure_ascii=False)
+    os.replace(f"{index_path}.json.tmp", f"{index_path}.json")
+
+
+class TemplateIndex:
+    """TF-IDF index over the curated prompts in ``example_blueprints.csv``.
+
+    The index is built once per version of the CSV and stored in the cache directory. Later loads memory-map the
+    matrix instead of rebuilding it, so only the rows a query touches are read.
+    """
+
+    def __init__(self, matrix, vocabulary, idf, templates):
+        self.matrix = matrix
+        self.columns = {term: column for column, term in enumerate(vocabulary)}
+        self.idf = idf
+        self.templates = templates
+
+    @classmethod
+    def load(cls, examples_path=EXAMPLES_PATH):
+        with open(examples_path, "rb") as file:
+            digest = hashlib.sha256(file.read() + str(INDEX_VERSION).encode()).hexdigest()[:16]
+        index_path = cache_path(f"templates-{digest}")
+        if not os.path.exists(f"{index_path}.json"):
+            build_index(examples_path, index_path)
+
+        with open(f"{index_path}.json", encoding="utf-8") as file:
+            metadata = json.load(file)
+        matrix = np.load(f"{index_path}.npy", mmap_mode="r")
+        templates = [Template(*template) for template in metadata["templates"]]
+        return cls(matrix, metadata["vocabulary"], metadata["idf"], templates)
+
+    def search(self, description, limit=3):
+        # Words no template uses still count towards the query's length, so vague matches score low. Unseen
+        # bigrams do not, or short paraphrases would be penalized for every new word order.
+        unseen_idf = math.log(1 + len(self.templates)) + 1
+        query = {}
+        norm = 0
+        for term, weight in term_weights(tokenize(description)).items():
+            column = self.columns.get(term)
+            value = weight * (unseen_idf if column is None else self.idf[column])
+            if column is not None or " " not in term:
+                norm += value ** 2
+            if column is not None:
+                query[column] = value
+        if not query:
+            return []
+
+        columns = list(query)
+        scores = np.asarray(self.matrix[:, columns]) @ np.array([query[column] for column in columns], dtype=np.float32) / math.sqrt(norm)
+        best = np.argsort(-scores)[:limit]
+        return [(float(scores[row]), self.templates[row]) for row in best if scores[row] > 0]
+
+
+index = None
+lock = threading.Lock()
+
+
+def get_index():
+    global index
+    with lock:
+        if index is None:
+            index = TemplateIndex.load()
+    return index
+
+
+def content_words(text):
+    return {term for term in tokenize(text) if " " not in term and term not in GENERIC_WORDS}
+
+
+def is_match(description, score, template, threshold=TEMPLATE_THRESHOLD):
+    # Generic words can carry a short description past the threshold on their own, as "track my reading list" does
+    # for a research template that keeps a reading list, so it also has to share what the template is about.
+    shared = content_words(description) & content_words(template.prompt)
+    return score >= threshold and len(shared) >= MIN_SHARED_WORDS
+
+
+def find_template(description, threshold=TEMPLATE_THRESHOLD):
+    matches = get_index().search(description, limit=1)
+    if matches and is_match(description, *matches[0], threshold):
+        return matches[0][1]
+    return None
+
+
+def replay_template(template):
+    """Yields a template the way ``generate_blueprint`` yields a completion, so callers can use either."""
+    yield template.response
+    yield {"response": template.response, "blueprint": copy.deepcopy(template.blueprint)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shows the curated templates closest to a description")
+    parser.add_argument("description", help="Text description of the desired content in Notion.")
+    parser.add_argument("--limit", type=int, default=3, help="Number of matches to show.")
+    args = parser.parse_args()
+
+    for score, template in get_index().search(args.description, args.limit):
+        marker = "*" if is_match(args.description, score, template) else " "
+        print(f"{marker} {score:.3f} [{template.category}] {template.prompt}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+# Words too common to say anything about what a description or title is about.
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been but by can could do for from get go going have help hi
+hello how i i'm if in into is it its just like make me my need notion of on one or our out page please should so
+some something such that the their them then there these they thing this to up us very want way we what when
+where which while who will with would you your
+""".split())
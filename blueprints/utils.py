@@ -1,21 +1,117 @@
+import asyncio
+import json
 import os
+import time
+from collections import deque
+from datetime import datetime
 
-from notion_client import Client
+from . import metrics
+from .diskcache import DiskCache, cache_path
+from .materializer import MAX_CONCURRENCY
+from .ratelimit import RateLimitedAsyncClient
 
 NOTION_KEY = os.environ["NOTION_KEY"]
-notion = Client(auth=NOTION_KEY)
+EXPORT_CACHE_SIZE = 256 * 1024 * 1024
+# Notion reports edit times to the minute, so an export is only known to be current a minute after the last edit.
+EDIT_TIME_RESOLUTION = 60
 
+LIST_TYPES = {"bulleted_list_item": "bulleted_list", "numbered_list_item": "numbered_list", "to_do": "to_do_list"}
 
-def process_page(page_id):
-    page = notion.pages.retrieve(page_id)
-    page_blueprint = {
-        "type": "page",
-        "title": page["properties"]["title"]["title"][0]["text"]["content"]
-    }
-    if page["icon"] is not None:
-        page_blueprint["icon"] = page["icon"]["emoji"]
-    page_blueprint["children"] = fetch_and_process_children(page_id)
-    return page_blueprint
+export_cache = DiskCache(cache_path("exports.sqlite3"), max_bytes=EXPORT_CACHE_SIZE)
+
+
+def process_page(page_id, include_ids=False, max_concurrency=MAX_CONCURRENCY, use_cache=True, icons=True, schemas=True,
+                 stats=False):
+    """Exports a page as a blueprint. With ``include_ids``, blocks carry their Notion ``id`` and lists the ``ids`` of their items.
+
+    Without ``icons`` and ``schemas``, subpages and databases are exported from their listing alone, with their titles
+    but no icons or database schemas, which saves a retrieve for each of them. With ``stats``, returns the blueprint
+    along with the run's ``metrics.Recorder.summary``.
+    """
+    with metrics.collect() as run:
+        blueprint = asyncio.run(export_page(page_id, include_ids, max_concurrency, use_cache=use_cache, icons=icons,
+                                            schemas=schemas))
+    return (blueprint, run.summary()) if stats else blueprint
+
+
+async def export_page(page_id, include_ids=False, max_concurrency=MAX_CONCURRENCY, notion=None, use_cache=True, icons=True,
+                      schemas=True):
+    cache = export_cache if use_cache else None
+    if notion is None:
+        async with RateLimitedAsyncClient(auth=NOTION_KEY) as notion:
+            return await Crawler(notion, max_concurrency, include_ids, cache, icons, schemas).page(page_id)
+    return await Crawler(notion, max_concurrency, include_ids, cache, icons, schemas).page(page_id)
+
+
+async def stream_page(page_id, max_concurrency=MAX_CONCURRENCY, notion=None, icons=True, schemas=True):
+    """Yields the records of a page, see ``Crawler.stream``. Streams bypass the export cache."""
+    if notion is None:
+        async with RateLimitedAsyncClient(auth=NOTION_KEY) as notion:
+            async for record in Crawler(notion, max_concurrency, icons=icons, schemas=schemas).stream(page_id):
+                yield record
+        return
+    async for record in Crawler(notion, max_concurrency, icons=icons, schemas=schemas).stream(page_id):
+        yield record
+
+
+async def write_ndjson(records, file):
+    """Writes records to ``file`` as they arrive, one JSON object per line, and returns how many were written."""
+    count = 0
+    async for record in records:
+        file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += 1
+    file.flush()
+    return count
+
+
+def export_ndjson(page_id, file, max_concurrency=MAX_CONCURRENCY, icons=True, schemas=True):
+    return asyncio.run(write_ndjson(stream_page(page_id, max_concurrency, icons=icons, schemas=schemas), file))
+
+
+def read_ndjson(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def assemble(records, include_ids=False):
+    """Rebuilds the blueprint ``process_page`` would export from a page's records."""
+    nodes = {}
+    for record in records:
+        node = dict(record["node"])
+        path = record["path"]
+        if path == "":
+            nodes[path] = node
+            continue
+
+        parent = nodes[path.rpartition(".")[0]]
+        key = "columns" if parent["type"] == "column_list" else "children"
+        if key not in parent:
+            parent[key] = []
+            if "id" in parent:
+                # The nested export puts a block's id after its children, so move it behind the list just added.
+                parent["id"] = parent.pop("id")
+        siblings = parent[key]
+
+        list_type = LIST_TYPES.get(node["type"])
+        if list_type is None:
+            if include_ids:
+                node["id"] = record["id"]
+            siblings.append(node)
+            nodes[path] = node
+            continue
+
+        if not siblings or siblings[-1]["type"] != list_type:
+            siblings.append({"type": list_type, "items": [], **({"ids": []} if include_ids else {})})
+        item = {"text": node["text"], "checked": node["checked"]} if list_type == "to_do_list" else node["text"]
+        siblings[-1]["items"].append(item)
+        if include_ids:
+            siblings[-1]["ids"].append(record["id"])
+    return nodes.get("")
+
+
+def edit_time(timestamp):
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp()
 
 
 def process_rich_text(rich_text):
@@ -39,70 +135,212 @@ def process_rich_text(rich_text):
     return content
 
 
-def fetch_and_process_children(parent_id):
-    children = []
-    block_children = notion.blocks.children.list(block_id=parent_id)["results"]
+def plain_text(rich_text):
+    return "".join(text["plain_text"] for text in rich_text)
+
+
+def emoji(icon):
+    if icon is not None and icon.get("type", "emoji") == "emoji":
+        return icon["emoji"]
+    return None
+
+
+def page_node(page, children=None):
+    page_blueprint = {
+        "type": "page",
+        "title": plain_text(page["properties"]["title"]["title"])
+    }
+    if emoji(page["icon"]) is not None:
+        page_blueprint["icon"] = emoji(page["icon"])
+    if children is not None:
+        page_blueprint["children"] = children
+    return page_blueprint
+
 
+def group_lists(blocks, include_ids=False):
+    """Merges runs of list item blocks into the list nodes of a blueprint. ``blocks`` are ``(block, node)`` pairs."""
+    children = []
     list_buffer = None
 
-    for child in block_children:
-        if child["type"] in ["bulleted_list_item", "numbered_list_item", "to_do"]:
-            list_type = "to_do_list" if child["type"] == "to_do" else "bulleted_list" if child["type"] == "bulleted_list_item" else "numbered_list"
+    for block, formatted_block in blocks:
+        list_type = LIST_TYPES.get(block["type"])
+        if list_type is None:
+            list_buffer = None
+            children.append(formatted_block)
+            continue
 
-            if list_buffer is None or list_buffer["type"] != list_type:
-                if list_buffer:
-                    children.append(list_buffer)
-                list_buffer = {"type": list_type, "items": []}
+        if list_buffer is None or list_buffer["type"] != list_type:
+            list_buffer = {"type": list_type, "items": []}
+            if include_ids:
+                list_buffer["ids"] = []
+            children.append(list_buffer)
 
-            if list_type == "to_do_list":
-                todo_item_text = child["to_do"]["rich_text"][0]["text"]["content"]
-                todo_item_checked = child["to_do"]["checked"]
-                list_buffer["items"].append({"text": todo_item_text, "checked": todo_item_checked})
-            else:
-                list_item_text = child[child["type"]]["rich_text"][0]["text"]["content"]
-                list_buffer["items"].append(list_item_text)
+        if list_type == "to_do_list":
+            list_buffer["items"].append({"text": plain_text(block["to_do"]["rich_text"]), "checked": block["to_do"]["checked"]})
+        else:
+            list_buffer["items"].append(plain_text(block[block["type"]]["rich_text"]))
+        if include_ids:
+            list_buffer["ids"].append(block["id"])
+
+    return children
+
+
+class Crawler:
+    """Exports a page tree as a blueprint, fetching independent subtrees concurrently.
+
+    Every listing follows ``next_cursor`` until Notion reports no more children. Subpages, toggles, columns and
+    other blocks with children are crawled side by side and reassembled in order, with the number of in-flight
+    Notion requests bounded by ``max_concurrency``.
 
+    Titles of subpages and databases are taken from the listing itself. Their icons and database schemas need a
+    retrieve each, so they are collected while crawling and fetched together once the structure is known, one
+    retrieve per ID. Without ``icons`` or ``schemas`` those retrieves are skipped altogether.
+
+    With a ``cache``, every exported page is stored under its ID along with its ``last_edited_time``, and a page
+    whose time has not moved since is taken from the cache instead of being crawled again. Notion only moves a
+    page's time for edits to its own blocks, so subpages and databases are stored as references and checked on
+    their own, which costs one retrieve each.
+    """
+
+    def __init__(self, notion, max_concurrency=MAX_CONCURRENCY, include_ids=False, cache=None, icons=True, schemas=True):
+        self.notion = notion
+        self.include_ids = include_ids
+        self.cache = cache
+        self.icons = icons
+        self.schemas = schemas
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        # The block IDs of the subpages and databases exported so far, by node.
+        self.refs = {}
+        # Retrieves still owed, by ID, with the nodes waiting on them.
+        self.details = {}
+        # Cache entries are only written once the details of their nodes are in.
+        self.entries = []
+
+    async def call(self, method, **kwargs):
+        async with self.semaphore:
+            return await method(**kwargs)
+
+    def listing(self, block_id, start_cursor=None):
+        kwargs = {"block_id": block_id, "page_size": 100}
+        if start_cursor is not None:
+            kwargs["start_cursor"] = start_cursor
+        return self.call(self.notion.blocks.children.list, **kwargs)
+
+    async def listings(self, block_id, first=None):
+        """Yields the children of ``block_id`` a response at a time. ``first`` is the first response, if already requested."""
+        response = await (first or self.listing(block_id))
+        while True:
+            yield response["results"]
+            if not response.get("has_more"):
+                return
+            response = await self.listing(block_id, response["next_cursor"])
+
+    async def list_children(self, block_id):
+        return [block async for blocks in self.listings(block_id) for block in blocks]
+
+    async def page(self, page_id):
+        if self.cache is None:
+            page, children = await asyncio.gather(self.call(self.notion.pages.retrieve, page_id=page_id),
+                                                  self.children(page_id))
+            page_blueprint = page_node(page, children)
         else:
-            if list_buffer:
-                children.append(list_buffer)
-                list_buffer = None
+            page = await self.call(self.notion.pages.retrieve, page_id=page_id)
+            page_blueprint = await self.page_tree(page_id, page["last_edited_time"], page_node(page))
+        await self.fill_details()
+        self.store()
+        return page_blueprint
 
-            formatted_block = format_block(child)
+    async def page_tree(self, page_id, edited, node, has_children=True, fetch_icon=False):
+        cached = self.cached(page_id, edited)
+        if cached is not None:
+            return await self.expand(cached)
 
-            if child.get("has_children", False):
-                formatted_block[
-                    "columns" if child["type"] == "column_list" else "children"] = fetch_and_process_children(
-                    child["id"])
+        started = time.time()
+        if fetch_icon:
+            self.request_details(page_id, "page", node)
+        if has_children:
+            node["children"] = await self.children(page_id)
+        self.remember(page_id, edited, started, node)
+        return node
 
-            children.append(formatted_block)
+    async def stream(self, page_id):
+        """Yields the blocks of a page one record at a time, in document order, without holding the page in memory.
 
-    if list_buffer:
-        children.append(list_buffer)
+        Each record has the block's ``path`` of child indices, its ``parent`` and its own ``id``, and its blueprint
+        ``node`` without children. List items are records of their own, ``assemble`` folds them into lists again.
+        """
+        page = await self.call(self.notion.pages.retrieve, page_id=page_id)
+        yield {"path": "", "parent": None, "id": page_id, "node": page_node(page)}
+        async for record in self.stream_children(page_id, ""):
+            yield record
 
-    return children
+    async def stream_children(self, parent_id, path, first=None):
+        index = 0
+        async for blocks in self.listings(parent_id, first):
+            nodes = await asyncio.gather(*(self.record_node(block) for block in blocks))
+            # The first listings of the next few subtrees are requested while the current one is streamed.
+            subtrees = deque(block["id"] for block in blocks if block.get("has_children") and block["type"] not in LIST_TYPES)
+            prefetched = {}
+            try:
+                for block, node in zip(blocks, nodes):
+                    while subtrees and len(prefetched) < self.max_concurrency:
+                        block_id = subtrees.popleft()
+                        prefetched[block_id] = asyncio.ensure_future(self.listing(block_id))
+                    block_path = f"{path}.{index}" if path else str(index)
+                    index += 1
+                    yield {"path": block_path, "parent": parent_id, "id": block["id"], "node": node}
+                    if block["id"] in prefetched:
+                        async for record in self.stream_children(block["id"], block_path, prefetched.pop(block["id"])):
+                            yield record
+            finally:
+                for task in prefetched.values():
+                    task.cancel()
+
+    async def record_node(self, block):
+        if block["type"] in LIST_TYPES:
+            node = {"type": block["type"], "text": plain_text(block[block["type"]]["rich_text"])}
+            if block["type"] == "to_do":
+                node["checked"] = block["to_do"]["checked"]
+            return node
+        if block["type"] == "child_page":
+            node = {"type": "page", "title": block["child_page"]["title"]}
+            if self.icons:
+                node.update(await self.fetch_details(block["id"], "page"))
+            return node
+        if block["type"] == "child_database":
+            node = {"type": "database", "title": block["child_database"]["title"]}
+            if self.schemas:
+                node.update(await self.fetch_details(block["id"], "database"))
+            return node
+        return await self.format_block(block)
+
+    def request_details(self, block_id, kind, node):
+        self.details.setdefault(block_id, (kind, []))[1].append(node)
+
+    async def fill_details(self):
+        details, self.details = self.details, {}
+        fetched = await asyncio.gather(*(self.fetch_details(block_id, kind) for block_id, (kind, _) in details.items()))
+        for (_, nodes), fields in zip(details.values(), fetched):
+            for node in nodes:
+                # Children and IDs stay last, where a crawl that had the details up front puts them.
+                rest = {key: node.pop(key) for key in ("children", "id") if key in node}
+                node.update(fields)
+                node.update(rest)
 
+    async def fetch_details(self, block_id, kind):
+        if kind == "page":
+            page = await self.call(self.notion.pages.retrieve, page_id=block_id)
+            return {"icon": emoji(page["icon"])} if emoji(page["icon"]) is not None else {}
 
-def format_block(block):
-    block_type = block["type"]
-    block_json = {"type": block_type}
-
-    if block_type == "child_page":
-        block_json["type"] = "page"
-        page_details = notion.pages.retrieve(block["id"])
-        block_json["title"] = page_details["properties"]["title"]["title"][0]["text"]["content"]
-        if page_details["icon"] is not None:
-            block_json["icon"] = page_details["icon"]["emoji"]
-
-    elif block_type == "child_database":
-        block_json["type"] = "database"
-        database_details = notion.databases.retrieve(database_id=block["id"])
-        block_json["title"] = database_details["title"][0]["plain_text"]
-        if database_details["icon"] is not None:
-            block_json["icon"] = database_details["icon"]["emoji"]
-        if database_details["is_inline"]:
-            block_json["is_inline"] = database_details["is_inline"]
+        database = await self.call(self.notion.databases.retrieve, database_id=block_id)
+        fields = {}
+        if emoji(database["icon"]) is not None:
+            fields["icon"] = emoji(database["icon"])
+        if database["is_inline"]:
+            fields["is_inline"] = database["is_inline"]
         properties = {}
-        for prop_name, prop_details in database_details["properties"].items():
+        for prop_name, prop_details in database["properties"].items():
             prop_type = prop_details["type"]
             if prop_type in ["select", "multi_select"]:
                 options = [{"name": option["name"], "color": option.get("color", "default")} for option in
@@ -112,33 +350,120 @@ def format_block(block):
                 properties[prop_name] = {"type": prop_type, "format": prop_details["number"].get("format", "none")}
             else:
                 properties[prop_name] = {"type": prop_type}
-        block_json["schema"] = properties
+        fields["schema"] = properties
+        return fields
+
+    def cache_key(self, block_id):
+        fields = [name for name, wanted in (("ids", self.include_ids), ("icons", self.icons), ("schemas", self.schemas)) if wanted]
+        return f"{block_id}:{'+'.join(fields) or 'plain'}"
+
+    def cached(self, block_id, edited):
+        if self.cache is None or edited is None:
+            return None
+        entry = self.cache.get(self.cache_key(block_id))
+        if entry is None or entry["edited"] != edited or entry["exported"] - edit_time(edited) < EDIT_TIME_RESOLUTION:
+            return None
+        return entry["node"]
+
+    def remember(self, block_id, edited, exported, node):
+        if self.cache is not None and edited is not None:
+            self.entries.append((block_id, {"edited": edited, "exported": exported, "node": node}))
+
+    def store(self):
+        for block_id, entry in self.entries:
+            node = self.shallow(entry["node"])
+            # A subpage's own ID is added by whoever lists it.
+            node.pop("id", None)
+            self.cache.set(self.cache_key(block_id), dict(entry, node=node))
+        self.entries = []
 
-    if block_type == "paragraph":
-        block_json["content"] = process_rich_text(block["paragraph"]["rich_text"])
+    def shallow(self, node, top=True):
+        if not top and id(node) in self.refs:
+            return {"type": node["type"], "ref": self.refs[id(node)], "title": node.get("title"),
+                    "has_children": "children" in node}
+        node = dict(node)
+        for key in ("children", "columns"):
+            if key in node:
+                node[key] = [self.shallow(child, False) for child in node[key]]
+        return node
+
+    async def expand(self, node):
+        node = dict(node)
+        for key in ("children", "columns"):
+            if key in node:
+                node[key] = list(await asyncio.gather(*(self.resolve(child) for child in node[key])))
+        return node
+
+    async def resolve(self, node):
+        if "ref" not in node:
+            return await self.expand(node)
+        if node["type"] == "page":
+            # The retrieve is needed for the page's edit time anyway, and brings its icon along.
+            page = await self.call(self.notion.pages.retrieve, page_id=node["ref"])
+            header = page_node(page)
+            if not self.icons:
+                header.pop("icon", None)
+            resolved = await self.page_tree(node["ref"], page["last_edited_time"], header, node["has_children"])
+        else:
+            resolved = self.database(node["ref"], node["title"])
+        self.refs[id(resolved)] = node["ref"]
+        if self.include_ids:
+            resolved["id"] = node["ref"]
+        return resolved
+
+    def database(self, database_id, title):
+        node = {"type": "database", "title": title}
+        if self.schemas:
+            self.request_details(database_id, "database", node)
+        return node
+
+    async def children(self, parent_id):
+        blocks = await self.list_children(parent_id)
+        formatted = await asyncio.gather(*(self.block(block) for block in blocks))
+        return group_lists(zip(blocks, formatted), self.include_ids)
+
+    async def block(self, block):
+        if block["type"] in LIST_TYPES:
+            # List items are folded into their list by group_lists, their own children are not part of a blueprint.
+            return None
+
+        if block["type"] == "child_page":
+            formatted_block = await self.page_tree(block["id"], block.get("last_edited_time"),
+                                                   {"type": "page", "title": block["child_page"]["title"]},
+                                                   block.get("has_children", False), self.icons)
+            self.refs[id(formatted_block)] = block["id"]
+        elif block["type"] == "child_database":
+            formatted_block = self.database(block["id"], block["child_database"]["title"])
+            self.refs[id(formatted_block)] = block["id"]
+        elif block.get("has_children", False):
+            formatted_block, children = await asyncio.gather(self.format_block(block), self.children(block["id"]))
+            formatted_block["columns" if block["type"] == "column_list" else "children"] = children
+        else:
+            formatted_block = await self.format_block(block)
 
-    elif block_type.startswith("heading_"):
-        block_json["text"] = block[block_type]["rich_text"][0]["text"]["content"]
+        if self.include_ids:
+            formatted_block["id"] = block["id"]
+        return formatted_block
 
-    elif block_type == "bulleted_list_item":
-        block_json["items"] = [text["plain_text"] for text in block["bulleted_list_item"]["rich_text"]]
+    async def format_block(self, block):
+        block_type = block["type"]
+        block_json = {"type": block_type}
 
-    elif block_type == "numbered_list_item":
-        block_json["items"] = [text["plain_text"] for text in block["numbered_list_item"]["rich_text"]]
+        if block_type == "paragraph":
+            block_json["content"] = process_rich_text(block["paragraph"]["rich_text"])
 
-    elif block_type == "to_do":
-        block_json["text"] = block["to_do"]["rich_text"][0]["text"]["content"]
-        block_json["checked"] = block["to_do"]["checked"]
+        elif block_type.startswith("heading_"):
+            block_json["text"] = plain_text(block[block_type]["rich_text"])
 
-    elif block_type == "toggle":
-        block_json["title"] = block["toggle"]["rich_text"][0]["text"]["content"]
+        elif block_type == "toggle":
+            block_json["title"] = plain_text(block["toggle"]["rich_text"])
 
-    elif block_type == "callout":
-        block_json["icon"] = block["callout"]["icon"]["emoji"]
-        block_json["color"] = block["callout"]["color"]
-        block_json["content"] = process_rich_text(block["callout"]["rich_text"])
+        elif block_type == "callout":
+            block_json["icon"] = emoji(block["callout"]["icon"])
+            block_json["color"] = block["callout"]["color"]
+            block_json["content"] = process_rich_text(block["callout"]["rich_text"])
 
-    elif block_type == "quote":
-        block_json["content"] = process_rich_text(block["quote"]["rich_text"])
+        elif block_type == "quote":
+            block_json["content"] = process_rich_text(block["quote"]["rich_text"])
 
-    return block_json
+        return block_json
@@ -0,0 +1,37 @@
+import argparse
+import sys
+
+from blueprints.export import EXPORT_WORKERS, export_workspace
+
+
+def report_page(export):
+    name = export.title or export.page_id
+    outcome = "exported" if export.error is None else f"failed with {type(export.error).__name__}: {export.error}"
+    print(f"[{export.done}/{export.total}] {name} {outcome} in {export.duration:.1f}s", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export many Notion pages as blueprints into a CSV or JSONL file.")
+    parser.add_argument("page_ids", nargs="*", help="IDs of the pages to export")
+    parser.add_argument("--root", metavar="PAGE_ID", help="Also export every page directly under this page")
+    parser.add_argument("-o", "--output", required=True, help="File to write, CSV if it ends in .csv and JSONL otherwise")
+    parser.add_argument("--category", default="", help="Category column of every exported row (e.g. Work, School or Personal)")
+    parser.add_argument("--workers", type=int, default=EXPORT_WORKERS, help="How many pages to export at once")
+    parser.add_argument("--fresh", action="store_true", help="Overwrite the output instead of resuming an earlier export into it")
+    parser.add_argument("--no-cache", action="store_true", help="Crawl every page again instead of reusing unchanged ones from earlier exports")
+    args = parser.parse_args()
+
+    if not args.page_ids and not args.root:
+        parser.error("give page IDs, a --root, or both")
+
+    try:
+        exported, failed = export_workspace(args.output, args.page_ids, args.root, args.workers, category=args.category,
+                                            use_cache=not args.no_cache, fresh=args.fresh, on_progress=report_page)
+    except FileExistsError:
+        parser.error(f"{args.output} already exists, pass --fresh to overwrite it")
+    print(f"Exported {exported} pages to {args.output}" + (f", {failed} failed" if failed else ""), file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,41 @@
 import argparse
 import os
+import sys
 
-from blueprints.architect import process_blueprint, generate_blueprint
+from blueprints import metrics
+from blueprints.architect import generate_page
+from blueprints.retry import MAX_ATTEMPTS, Retrying, run_with_retries
+
+
+def report_attempt(attempt):
+    outcome = "succeeded" if attempt.succeeded else f"failed with {type(attempt.error).__name__}: {attempt.error}"
+    print(f"\nAttempt {attempt.number} {outcome} after {attempt.duration:.1f}s", file=sys.stderr)
 
 
 def main():
     parser = argparse.ArgumentParser(description="Generates Notion content given a brief description")
     parser.add_argument("description", help="Text description of the desired content in Notion.")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the model instead of replaying a cached generation.")
+    parser.add_argument("--no-templates", action="store_true", help="Always call the model, even when a curated template matches the description.")
+    parser.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS, help="How many times to try before giving up.")
+    parser.add_argument("--stats", action="store_true", help="Print the API calls the run made, with their sizes and latencies.")
     args = parser.parse_args()
 
     notion_page_id = os.environ["NOTION_PAGE_ID"]
 
-    content = None
-    for update in generate_blueprint(args.description):
-        if isinstance(update, dict):
-            content = update
-        else:
-            print(update, end="", flush=True)
-
-    blueprint = content["blueprint"]
-    process_blueprint(notion_page_id, blueprint)
+    def attempt(previous, owner):
+        return generate_page(notion_page_id, args.description, use_cache=not args.no_cache, use_templates=not args.no_templates, previous=previous, owner=owner)
+
+    with metrics.collect() as run:
+        try:
+            for update in run_with_retries(attempt, args.max_attempts, on_attempt=report_attempt):
+                if isinstance(update, Retrying):
+                    print(f"Retrying ({update.attempt.number + 1}/{update.max_attempts}) in {update.attempt.delay:.1f}s...", file=sys.stderr)
+                elif isinstance(update, str):
+                    print(update, end="", flush=True)
+        finally:
+            if args.stats:
+                print("\n" + metrics.format_summary(run.summary()), file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -1,46 +1,49 @@
 import json
 import os
-import time
 
 import gradio as gr
-from pydantic import ValidationError
 
-from blueprints.architect import generate_blueprint, process_blueprint
-from blueprints.schema import OpenAIResponse
+from blueprints import metrics
+from blueprints.architect import generate_page
+from blueprints.repair import InvalidResponse
+from blueprints.retry import MAX_ATTEMPTS, Retrying, Waiting, run_with_retries
 
 NOTION_PAGE_ID = os.environ["NOTION_PAGE_ID"]
 MODEL_NAME = os.environ["NOTION_GPT_MODEL_NAME"]
 
 
-def gradio_blueprint_interface(description, model_name, force_json, auto_restart, temperature, top_p, error=None, failed_response=None):
+def report_attempt(attempt):
+    outcome = "succeeded" if attempt.succeeded else f"failed with {type(attempt.error).__name__}"
+    print(f"Attempt {attempt.number} {outcome} after {attempt.duration:.1f}s")
+
+
+def describe_error(error):
+    if isinstance(error, InvalidResponse):
+        return f"Validation failed: {json.dumps(error.error.json(), separators=(',', ':'))}"
+    return f"Error encountered: {error}"
+
+
+def gradio_blueprint_interface(description, model_name, force_json, auto_restart, temperature, top_p, use_cache, use_templates):
+    def attempt(previous, owner):
+        return generate_page(NOTION_PAGE_ID, description, model_name, force_json, temperature, top_p, use_cache, use_templates, previous, owner)
+
+    max_attempts = MAX_ATTEMPTS if auto_restart else 1
+    cumulative_content = ""
     try:
-        cumulative_content = ""
-        for update in generate_blueprint(description, model_name, force_json, temperature, top_p, error, failed_response):
-            if isinstance(update, dict):
+        for update in run_with_retries(attempt, max_attempts, on_attempt=report_attempt):
+            if isinstance(update, Retrying):
+                cumulative_content = ""
+                yield f"{describe_error(update.attempt.error)}. Restarting ({update.attempt.number + 1}/{update.max_attempts})..."
+            elif isinstance(update, Waiting):
+                yield f"{describe_error(update.attempt.error)}. Restarting ({update.attempt.number + 1}/{max_attempts}) in {update.remaining:.0f}s..."
+            elif isinstance(update, dict):
                 yield "Blueprint generation complete. Processing blueprint..."
-                try:
-                    OpenAIResponse(**update)
-                    process_blueprint(NOTION_PAGE_ID, update.get("blueprint", {}))
-                    yield f"Blueprint successfully processed! 🎉"
-                except ValidationError as e:
-                    error = json.dumps(e.json(), separators=(",", ":"))
-                    failed_response = json.dumps(update, separators=(",", ":"))
-                    if auto_restart:
-                        yield f"Validation failed: f{error}. Restarting..."
-                        time.sleep(5)
-                        yield from gradio_blueprint_interface(description, model_name, force_json, auto_restart, temperature, top_p, error, failed_response)
-                    else:
-                        yield f"Validation failed: f{error}."
             else:
                 cumulative_content += update
                 yield cumulative_content
+        yield f"Blueprint successfully processed! 🎉"
     except Exception as e:
-        if auto_restart:
-            yield f"Error encountered: {str(e)}. Restarting..."
-            time.sleep(5)
-            yield from gradio_blueprint_interface(description, model_name, force_json, auto_restart, temperature, top_p)
-        else:
-            yield f"Error encountered: {str(e)}."
+        yield f"{describe_error(e)}."
 
 
 def main():
@@ -55,11 +58,14 @@ def main():
             gr.Checkbox(label="Auto Restart", value=True),
             gr.Slider(label="Temperature", minimum=0.1, maximum=1.0, step=0.1, value=0.4),
             gr.Slider(label="Top P", minimum=0.1, maximum=1.0, step=0.1, value=0.9),
+            gr.Checkbox(label="Use Cache", value=True),
+            gr.Checkbox(label="Use Templates", value=True),
         ],
         outputs=[gr.Text(label="Process Output")],
         title="NotionGPT",
         description="Enter a description to generate and process a custom Notion page layout."
     )
+    metrics.serve()
     iface.launch()
 
 
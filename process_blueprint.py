@@ -1,8 +1,10 @@
 import argparse
 import json
 import os
+import sys
 
-from blueprints.architect import process_blueprint
+from blueprints import metrics
+from blueprints.architect import process_blueprint, update_page
 
 
 def load_blueprint(filename):
@@ -13,12 +15,25 @@ def load_blueprint(filename):
 def main():
     parser = argparse.ArgumentParser(description="Process a JSON blueprint to create content in Notion.")
     parser.add_argument("json_file", help="Location of the JSON blueprint file")
+    parser.add_argument("--seed", help="Seed for picking icons, so repeated runs choose the same ones")
+    parser.add_argument("--update", metavar="PAGE_ID", help="Update this existing page to match the blueprint instead of creating a new one")
+    parser.add_argument("--no-resume", action="store_true", help="Start a new page even if an earlier run of this blueprint failed part way")
+    parser.add_argument("--stats", action="store_true", help="Print the API calls the run made, with their sizes and latencies")
     args = parser.parse_args()
 
     notion_page_id = os.environ["NOTION_PAGE_ID"]
 
     blueprint = load_blueprint(args.json_file)
-    process_blueprint(notion_page_id, blueprint)
+    if args.update:
+        with metrics.collect() as run:
+            stats = update_page(args.update, blueprint, seed=args.seed)
+        print(", ".join(f"{count} {operation}" for operation, count in sorted(stats.items())) or "Nothing to change")
+        summary = run.summary()
+    else:
+        summary = process_blueprint(notion_page_id, blueprint, seed=args.seed, resume=not args.no_resume)
+
+    if args.stats:
+        print(metrics.format_summary(summary), file=sys.stderr)
 
 
 if __name__ == "__main__":
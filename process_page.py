@@ -1,20 +1,33 @@
 import argparse
 import json
+import sys
 
-from blueprints.utils import process_page
+from blueprints.utils import export_ndjson, process_page
 
 
-def pretty_print_blueprint(page_id):
-    blueprint_json = process_page(page_id)
+def pretty_print_blueprint(page_id, use_cache=True, icons=True, schemas=True):
+    blueprint_json = process_page(page_id, use_cache=use_cache, icons=icons, schemas=schemas)
     print(json.dumps(blueprint_json, indent=4))
 
 
 def main():
     parser = argparse.ArgumentParser(description="Process and print a Notion page as a JSON blueprint.")
     parser.add_argument("page_id", help="The Notion page ID to process")
+    parser.add_argument("--no-cache", action="store_true", help="Crawl every page again instead of reusing unchanged ones from earlier exports")
+    parser.add_argument("--no-icons", action="store_true", help="Leave out the icons of subpages and databases, which saves a request per subpage")
+    parser.add_argument("--no-schemas", action="store_true", help="Leave out database schemas, which saves a request per database")
+    parser.add_argument("--ndjson", metavar="PATH", help="Stream the page to PATH (- for stdout) one block per line as it is crawled, instead of printing the whole blueprint at the end")
     args = parser.parse_args()
 
-    pretty_print_blueprint(args.page_id)
+    if args.ndjson == "-":
+        export_ndjson(args.page_id, sys.stdout, icons=not args.no_icons, schemas=not args.no_schemas)
+        return
+    if args.ndjson:
+        with open(args.ndjson, "w", encoding="utf-8") as file:
+            export_ndjson(args.page_id, file, icons=not args.no_icons, schemas=not args.no_schemas)
+        return
+
+    pretty_print_blueprint(args.page_id, not args.no_cache, not args.no_icons, not args.no_schemas)
 
 
 if __name__ == "__main__":
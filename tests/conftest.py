@@ -0,0 +1,27 @@
+import os
+import tempfile
+
+# The modules read their keys and cache location on import, and the tests never reach the real services.
+os.environ.setdefault("NOTION_KEY", "test")
+os.environ.setdefault("UNSPLASH_ACCESS_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("NOTION_GPT_MODEL_NAME", "test")
+os.environ["NOTION_GPT_CACHE_DIR"] = tempfile.mkdtemp(prefix="notion-gpt-tests-")
+
+import pytest
+
+from benchmarks.fake_notion import FakeNotion
+from blueprints.ratelimit import limiter
+
+
+@pytest.fixture(autouse=True)
+def unlimited(monkeypatch):
+    # The fake server answers at once, so Notion's 3 requests per second would only slow the tests down.
+    monkeypatch.setattr(limiter, "rate", 10000)
+    monkeypatch.setattr(limiter, "burst", 10000)
+
+
+@pytest.fixture
+def server():
+    with FakeNotion() as server:
+        yield server
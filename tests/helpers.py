@@ -0,0 +1,51 @@
+import asyncio
+
+from blueprints.materializer import Materializer, collect_titles
+from blueprints.ratelimit import RateLimitedAsyncClient
+from blueprints.utils import export_page
+
+
+def paragraph(text):
+    return {"type": "paragraph", "content": [{"text": text, "style": []}]}
+
+
+def page(title, children):
+    return {"type": "page", "title": title, "icon": "📄", "children": children}
+
+
+def client(server):
+    return RateLimitedAsyncClient(auth="test", base_url=server.url)
+
+
+async def materialize_async(server, parent_id, blueprint, journal=None):
+    # Covers are left out so Unsplash is never called.
+    covers = {title: None for title in collect_titles(blueprint)}
+    async with client(server) as notion:
+        await Materializer(notion, seed=0, covers=covers, journal=journal).run(parent_id, blueprint)
+
+
+def materialize(server, blueprint, journal=None, parent_id=None):
+    """Writes ``blueprint`` under a new root page of ``server`` and returns the ID of the page it created."""
+    parent_id = parent_id or server.add_page("Root")
+    asyncio.run(materialize_async(server, parent_id, blueprint, journal))
+    return server.children[parent_id][0]
+
+
+def export(server, page_id, include_ids=False):
+    async def run():
+        async with client(server) as notion:
+            return await export_page(page_id, include_ids, notion=notion, use_cache=False)
+    return asyncio.run(run())
+
+
+def texts(children):
+    """The text of each child of an exported level, for comparing pages without their formatting."""
+    result = []
+    for child in children:
+        if "content" in child:
+            result.append("".join(item["text"] for item in child["content"]))
+        elif "items" in child:
+            result.append([item["text"] if isinstance(item, dict) else item for item in child["items"]])
+        else:
+            result.append(child.get("text") or child.get("title") or child["type"])
+    return result
@@ -0,0 +1,150 @@
+import asyncio
+
+from blueprints.diff import PageUpdater, align, units
+from blueprints.materializer import collect_titles
+from blueprints.utils import export_page
+
+from .helpers import client, export, materialize, page, paragraph, texts
+
+
+def heading(text):
+    return {"type": "heading_2", "text": text}
+
+
+def keys(units_):
+    return [unit.key for unit in units_]
+
+
+def update(server, page_id, blueprint):
+    async def run():
+        async with client(server) as notion:
+            current = await export_page(page_id, True, notion=notion, use_cache=False)
+            updater = PageUpdater(notion, seed=0)
+            updater.materializer.covers.update((title, None) for title in collect_titles(blueprint))
+            return await updater.run(page_id, current, blueprint)
+    return asyncio.run(run())
+
+
+def test_align_keeps_identical_levels():
+    old = units([heading("a"), paragraph("b")])
+    placed, deleted = align(old, units([heading("a"), paragraph("b")]))
+    assert [previous for _, previous in placed] == old
+    assert deleted == []
+
+
+def test_align_updates_blocks_of_the_same_type_in_place():
+    old = units([heading("a"), paragraph("b"), paragraph("c")])
+    new = units([heading("a"), paragraph("B"), paragraph("c")])
+    placed, deleted = align(old, new)
+    assert [previous for _, previous in placed] == old
+    assert keys(unit for unit, _ in placed) == keys(new)
+    assert deleted == []
+
+
+def test_align_replaces_blocks_whose_type_changed():
+    old = units([heading("a"), paragraph("b")])
+    placed, deleted = align(old, units([heading("a"), {"type": "quote", "content": [{"text": "b", "style": []}]}]))
+    assert [previous for _, previous in placed] == [old[0], None]
+    assert deleted == [old[1]]
+
+
+def test_align_inserts_and_deletes():
+    old = units([heading("a"), paragraph("b"), paragraph("c"), heading("d")])
+    placed, deleted = align(old, units([heading("a"), heading("new"), heading("d")]))
+    assert [previous for _, previous in placed] == [old[0], None, old[3]]
+    assert deleted == [old[1], old[2]]
+
+
+def test_align_matches_list_items_one_by_one():
+    old = units([{"type": "bulleted_list", "items": ["x", "y", "z"]}])
+    placed, deleted = align(old, units([{"type": "bulleted_list", "items": ["x", "z"]}]))
+    assert [previous for _, previous in placed] == [old[0], old[2]]
+    assert deleted == [old[1]]
+
+
+def test_update_leaves_an_unchanged_page_alone(server):
+    blueprint = page("Same", [heading("a"), paragraph("b"), {"type": "toggle", "text": "t", "children": [paragraph("c")]}])
+    page_id = materialize(server, blueprint)
+    server.reset_stats()
+    stats = update(server, page_id, blueprint)
+    assert stats == {"kept": 4}
+    assert all(endpoint.startswith("GET") for endpoint in server.requests)
+
+
+def test_update_edits_inserts_and_deletes(server):
+    page_id = materialize(server, page("Plan", [
+        heading("Intro"),
+        paragraph("first"),
+        paragraph("second"),
+        {"type": "toggle", "text": "Details", "children": [paragraph("one"), paragraph("two")]},
+        paragraph("stale"),
+        paragraph("last"),
+    ]))
+    revised = page("Revised plan", [
+        heading("Intro"),
+        paragraph("first, edited"),
+        {"type": "bulleted_list", "items": ["new", "items"]},
+        paragraph("second"),
+        {"type": "toggle", "text": "Details", "children": [paragraph("one"), paragraph("three")]},
+        paragraph("last"),
+    ])
+    stats = update(server, page_id, revised)
+    assert stats["deleted"] == 1
+    assert stats["inserted"] == 2
+
+    exported = export(server, page_id)
+    assert exported["title"] == "Revised plan"
+    assert texts(exported["children"]) == ["Intro", "first, edited", ["new", "items"], "second", "Details", "last"]
+    assert exported["children"][4]["children"] == [paragraph("one"), paragraph("three")]
+
+
+def test_update_inserts_in_front_of_the_first_block(server):
+    page_id = materialize(server, page("Front", [paragraph("old first"), paragraph("rest")]))
+    update(server, page_id, page("Front", [heading("new"), paragraph("old first"), paragraph("rest")]))
+    assert texts(export(server, page_id)["children"]) == ["new", "old first", "rest"]
+
+
+def test_update_keeps_blocks_after_a_new_subpage_in_order(server):
+    page_id = materialize(server, page("Parent", [paragraph("before"), paragraph("after")]))
+    update(server, page_id, page("Parent", [paragraph("before"), page("Child", [paragraph("inside")]), paragraph("after")]))
+    exported = export(server, page_id)
+    assert texts(exported["children"]) == ["before", "Child", "after"]
+    assert exported["children"][1]["children"] == [paragraph("inside")]
+
+
+TASKS = {"type": "database", "title": "Tasks", "icon": "✅", "schema": {
+    "Name": {"type": "title"},
+    "Status": {"type": "select", "options": [{"name": "Done", "color": "green"}]},
+}}
+
+
+def test_align_keeps_renamed_subpages():
+    old = units([page("Notes", [paragraph("a")]), paragraph("b")])
+    placed, deleted = align(old, units([page("Meeting notes", [paragraph("a")]), paragraph("b")]))
+    assert [previous for _, previous in placed] == old
+    assert deleted == []
+
+
+def test_update_never_recreates_subpages_or_databases(server):
+    page_id = materialize(server, page("Workspace", [TASKS, page("Notes", [paragraph("kept")])]))
+    before = export(server, page_id, include_ids=True)["children"]
+
+    budget = {"type": "database", "title": "Budget", "icon": "💰", "schema": {"Item": {"type": "title"}}}
+    stats = update(server, page_id, page("Workspace", [heading("Budget"), budget, TASKS, page("Notes", [paragraph("kept")])]))
+    assert stats["deleted"] == 0
+
+    after = export(server, page_id, include_ids=True)["children"]
+    assert [after[0]["id"], after[2]["id"]] == [child["id"] for child in before]
+    assert texts(after[2]["children"]) == ["kept"]
+    # Neither can be moved behind new blocks, so the heading follows the first of them and the database goes last.
+    assert texts(after) == ["Tasks", "Budget", "Notes", "Budget"]
+    assert [child["type"] for child in after] == ["database", "heading_2", "page", "database"]
+
+
+def test_update_renames_subpages_in_place(server):
+    page_id = materialize(server, page("Parent", [paragraph("intro"), page("Notes", [paragraph("kept")])]))
+    sub_id = export(server, page_id, include_ids=True)["children"][1]["id"]
+    update(server, page_id, page("Parent", [paragraph("intro"), page("Meeting notes", [paragraph("kept")])]))
+    subpage = export(server, page_id, include_ids=True)["children"][1]
+    assert (subpage["id"], subpage["title"]) == (sub_id, "Meeting notes")
+    assert texts(subpage["children"]) == ["kept"]
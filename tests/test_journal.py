@@ -0,0 +1,106 @@
+import pytest
+from notion_client import APIResponseError
+
+from blueprints.journal import Journal, open_journal, ownership, run_id
+
+from .helpers import export, materialize, page, paragraph, texts
+
+BLUEPRINT = page("Resumable", [
+    {"type": "heading_1", "text": "Start"},
+    {"type": "bulleted_list", "items": [f"item {index}" for index in range(150)]},
+    {"type": "toggle", "text": "Folded", "children": [paragraph(f"inside {index}") for index in range(5)]},
+    page("Sub", [paragraph("nested")]),
+    paragraph("end"),
+])
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return Journal("test", path=str(tmp_path / "journal.sqlite3"))
+
+
+def fail_append(server, after, applied):
+    """Makes the append following the first ``after`` answer with a 500, once, either before or after applying it."""
+    respond = server.respond
+    appends = []
+
+    def failing(method, path, query, raw):
+        if method == "PATCH" and path.endswith("/children"):
+            appends.append(path)
+            if len(appends) == after + 1:
+                if applied:
+                    respond(method, path, query, raw)
+                return 500, {"object": "error", "status": 500, "code": "internal_server_error", "message": "injected"}, {}
+        return respond(method, path, query, raw)
+
+    server.respond = failing
+
+
+@pytest.mark.parametrize("applied", [False, True])
+@pytest.mark.parametrize("after", [0, 1, 3])
+def test_resume_after_failed_append(server, journal, after, applied):
+    parent_id = server.add_page("Root")
+    fail_append(server, after, applied)
+    with pytest.raises(APIResponseError):
+        materialize(server, BLUEPRINT, journal, parent_id)
+
+    page_id = materialize(server, BLUEPRINT, journal, parent_id)
+    assert len(server.children[parent_id]) == 1
+
+    exported = export(server, page_id)
+    assert texts(exported["children"]) == [
+        "Start", [f"item {index}" for index in range(150)], "Folded", "Sub", "end"
+    ]
+    assert exported["children"][2]["children"] == [paragraph(f"inside {index}") for index in range(5)]
+    assert exported["children"][3]["children"] == [paragraph("nested")]
+
+
+def test_resume_without_journal_duplicates(server):
+    parent_id = server.add_page("Root")
+    fail_append(server, 1, applied=True)
+    with pytest.raises(APIResponseError):
+        materialize(server, BLUEPRINT, parent_id=parent_id)
+    materialize(server, BLUEPRINT, parent_id=parent_id)
+    assert len(server.children[parent_id]) == 2
+
+
+def test_concurrent_runs_get_their_own_journal():
+    with ownership() as first, ownership() as second:
+        shared = open_journal(first, "parent", "blueprint")
+        separate = open_journal(second, "parent", "blueprint")
+        assert shared.run == run_id("parent", "blueprint")
+        assert separate.run != shared.run
+        # Later attempts of each run keep the journal they started with.
+        assert open_journal(first, "parent", "blueprint").run == shared.run
+        assert open_journal(second, "parent", "blueprint").run == separate.run
+
+
+def test_finished_run_releases_its_journal():
+    with ownership() as first:
+        claimed = open_journal(first, "released", "blueprint")
+    assert claimed.holder() is None
+    with ownership() as second:
+        assert open_journal(second, "released", "blueprint").run == claimed.run
+
+
+def contents(exported):
+    block, = exported["children"]
+    return block["children"] if block["type"] == "toggle" else block["columns"][0]["children"]
+
+
+@pytest.mark.parametrize("container", [
+    {"type": "toggle", "text": "Long", "children": [paragraph(str(index)) for index in range(150)]},
+    {"type": "column_list", "columns": [{"type": "column", "children": [paragraph(str(index)) for index in range(150)]},
+                                        {"type": "column", "children": [paragraph("right")]}]},
+], ids=["toggle", "column"])
+@pytest.mark.parametrize("applied", [False, True])
+def test_resume_after_failed_deferred_append(server, journal, container, applied):
+    # The container is created with 100 or so children inline, the rest follow in an append of their own.
+    blueprint = page("Deferred", [container])
+    parent_id = server.add_page("Root")
+    fail_append(server, 1, applied)
+    with pytest.raises(APIResponseError):
+        materialize(server, blueprint, journal, parent_id)
+
+    page_id = materialize(server, blueprint, journal, parent_id)
+    assert texts(contents(export(server, page_id))) == [str(index) for index in range(150)]
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from blueprints.jsonstream import BlueprintStarted, BlueprintStreamParser, ChildCompleted, Done, ResponseDelta
+
+CONTENT = {
+    "response": "Here is a page for your trip to Kyōto 🚀 with a \"quoted\" plan.\nEnjoy!",
+    "blueprint": {
+        "type": "page",
+        "title": "Trip \\ Planner",
+        "icon": "🗺️",
+        "children": [
+            {"type": "heading_1", "text": "Itinerary"},
+            {"type": "paragraph", "content": [{"text": "Day 1: arrive, tab\there", "style": ["bold"]}]},
+            {"type": "to_do_list", "items": [{"text": "Book hotel", "checked": False}, {"text": "Pack", "checked": True}]},
+            {"type": "database", "title": "Budget", "icon": "💰", "is_inline": True,
+             "schema": {"Item": {"type": "title"}, "Cost": {"type": "number", "format": "yen"}}},
+        ],
+    },
+}
+# Non-ASCII characters escaped, so chunks can also split \uXXXX escapes and surrogate pairs.
+TEXT = json.dumps(CONTENT)
+
+
+def parse(chunks):
+    parser = BlueprintStreamParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    return parser, events
+
+
+def check(events):
+    assert "".join(event.text for event in events if isinstance(event, ResponseDelta)) == CONTENT["response"]
+    started = [event for event in events if isinstance(event, BlueprintStarted)]
+    assert len(started) == 1
+    assert started[0].header["title"] == CONTENT["blueprint"]["title"]
+    completed = [event for event in events if isinstance(event, ChildCompleted)]
+    assert [event.index for event in completed] == list(range(len(CONTENT["blueprint"]["children"])))
+    assert [event.child for event in completed] == CONTENT["blueprint"]["children"]
+    assert events[-1] == Done(CONTENT, False)
+
+
+def test_whole_text():
+    parser, events = parse([TEXT])
+    check(events)
+    assert parser.done and not parser.failed
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 16])
+def test_fixed_chunk_sizes(size):
+    _, events = parse([TEXT[start:start + size] for start in range(0, len(TEXT), size)])
+    check(events)
+
+
+def test_every_split_point():
+    for split in range(1, len(TEXT)):
+        _, events = parse([TEXT[:split], TEXT[split:]])
+        check(events)
+
+
+def test_split_inside_surrogate_pair():
+    split = TEXT.index("\\ud83d") + len("\\ud83d\\u")
+    _, events = parse([TEXT[:split], TEXT[split:]])
+    check(events)
+
+
+def test_leading_text_and_whitespace():
+    _, events = parse(["  \n", TEXT[:40], TEXT[40:]])
+    check(events)
+
+
+def test_truncated_stream_is_closed_by_finish():
+    end = TEXT.index('{"type": "to_do_list"')
+    parser, events = parse([TEXT[:end - 30], TEXT[end - 30:end + 20]])
+    assert [event.index for event in events if isinstance(event, ChildCompleted)] == [0, 1]
+    done, = parser.finish()
+    assert done.repaired
+    assert done.content["blueprint"]["children"][:2] == CONTENT["blueprint"]["children"][:2]
+
+
+def test_invalid_json_fails():
+    parser, events = parse(['{"response": "x", ] '])
+    assert parser.failed
+    assert not any(isinstance(event, Done) for event in events)
+    assert parser.finish() == []
@@ -0,0 +1,134 @@
+from blueprints.blocks import MAX_BLOCKS_PER_REQUEST, MAX_CHILDREN_PER_REQUEST
+from blueprints.materializer import Continuation, compile_block, compile_column_list
+
+from .helpers import export, materialize, page, paragraph, texts
+
+APPEND = "PATCH /v1/blocks/{id}/children"
+
+
+def nested_size(payloads):
+    return sum(1 + nested_size(payload[payload["type"]].get("children", [])) for payload in payloads)
+
+
+def depth(payloads):
+    return max((1 + depth(payload[payload["type"]].get("children", [])) for payload in payloads), default=0)
+
+
+def test_compile_block_inlines_small_subtrees():
+    toggle = {"type": "toggle", "text": "Box", "children": [paragraph("a"), {"type": "bulleted_list", "items": ["x", "y"]}]}
+    payloads, deferred, size = compile_block(toggle)
+    assert deferred == []
+    assert size == nested_size(payloads) == 4
+    assert [child["type"] for child in payloads[0]["toggle"]["children"]] == ["paragraph", "bulleted_list_item", "bulleted_list_item"]
+
+
+def test_compile_block_defers_what_is_nested_too_deep():
+    innermost = {"type": "toggle", "text": "3", "children": [paragraph("deep")]}
+    toggle = {"type": "toggle", "text": "1", "children": [{"type": "toggle", "text": "2", "children": [innermost]}]}
+    payloads, deferred, size = compile_block(toggle)
+    assert depth(payloads) == 3
+    assert deferred == [((0, 0), [paragraph("deep")])]
+
+
+def test_compile_block_stays_within_the_request_limits():
+    children = [{"type": "toggle", "text": str(index), "children": [paragraph(str(n)) for n in range(30)]}
+                for index in range(60)]
+    payloads, deferred, size = compile_block({"type": "callout", "icon": "💡", "color": "default",
+                                              "content": [], "children": children})
+    assert size == nested_size(payloads) <= MAX_BLOCKS_PER_REQUEST
+    inlined = payloads[0]["callout"]["children"]
+    assert len(inlined) <= MAX_CHILDREN_PER_REQUEST
+    # The last inlined toggle is cut where the budget runs out and the rest follows after it, in order.
+    last = len(inlined) - 1
+    kept = len(inlined[last]["toggle"]["children"])
+    assert deferred == [((last,), children[last]["children"][kept:]), ((), children[last + 1:])]
+
+
+def test_compile_block_with_a_small_budget():
+    children = [paragraph(str(index)) for index in range(10)]
+    payloads, deferred, size = compile_block({"type": "quote", "content": [], "children": children}, budget=4)
+    assert size == 4
+    assert deferred == [((), children[3:])]
+
+
+def test_materialize_batches_siblings(server):
+    page_id = materialize(server, page("Batched", [paragraph(str(index)) for index in range(250)]))
+    # 250 blocks are appended 100 at a time.
+    assert server.requests == {"POST /v1/pages": 1, APPEND: 3}
+    assert texts(export(server, page_id)["children"]) == [str(index) for index in range(250)]
+
+
+def test_materialize_splits_batches_around_subpages(server):
+    page_id = materialize(server, page("Split", [paragraph("before"), page("Sub", [paragraph("inside")]), paragraph("after")]))
+    assert server.requests == {"POST /v1/pages": 2, APPEND: 3}
+    exported = export(server, page_id)
+    assert texts(exported["children"]) == ["before", "Sub", "after"]
+    assert exported["children"][1]["children"] == [paragraph("inside")]
+
+
+
+def test_materialize_creates_subtrees_in_one_append(server):
+    toggle = {"type": "toggle", "text": "Box", "children": [paragraph("a"), {"type": "quote", "content": [{"text": "b", "style": []}]}]}
+    page_id = materialize(server, page("Subtree", [toggle, paragraph("after")]))
+    assert server.requests == {"POST /v1/pages": 1, APPEND: 1}
+    assert export(server, page_id)["children"][0]["children"] == toggle["children"]
+
+
+def test_compile_column_list_inlines_every_column():
+    column_list = {"type": "column_list", "columns": [
+        {"type": "column", "children": [paragraph("left"), {"type": "toggle", "text": "t", "children": [paragraph("in")]}]},
+        {"type": "column", "children": [{"type": "heading_2", "text": "right"}]},
+    ]}
+    payloads, deferred, size = compile_column_list(column_list)
+    columns = payloads[0]["column_list"]["children"]
+    assert [len(column["column"]["children"]) for column in columns] == [2, 1]
+    # The toggle sits at the deepest level Notion allows, so its child follows once it exists.
+    assert deferred == [((0, 1), [paragraph("in")])]
+    assert size == nested_size(payloads)
+
+
+def test_compile_column_list_keeps_room_for_every_column():
+    first = [paragraph(str(index)) for index in range(60)]
+    column_list = {"type": "column_list", "columns": [
+        {"type": "column", "children": first},
+        {"type": "column", "children": [paragraph("second")]},
+    ]}
+    payloads, deferred, size = compile_column_list(column_list, budget=40)
+    left, right = payloads[0]["column_list"]["children"]
+    assert right["column"]["children"][0]["paragraph"]["rich_text"][0]["text"]["content"] == "second"
+    assert size <= 40
+    assert deferred == [((0,), first[len(left["column"]["children"]):])]
+
+
+def test_compile_column_list_splits_a_list_too_long_for_its_column():
+    items = {"type": "numbered_list", "items": [str(index) for index in range(250)]}
+    column_list = {"type": "column_list", "columns": [{"type": "column", "children": [items, paragraph("after")]}]}
+    payloads, deferred, _ = compile_column_list(column_list)
+    column = payloads[0]["column_list"]["children"][0]["column"]["children"]
+    assert len(column) == MAX_CHILDREN_PER_REQUEST
+    assert all(block["type"] == "numbered_list_item" for block in column)
+    assert deferred == [((0,), [Continuation(items, MAX_CHILDREN_PER_REQUEST), paragraph("after")])]
+
+def test_materialize_large_page(server):
+    blueprint = page("Large", [
+        {"type": "heading_1", "text": "Top"},
+        {"type": "bulleted_list", "items": [f"item {index}" for index in range(230)]},
+        {"type": "toggle", "text": "Deep", "children": [
+            {"type": "toggle", "text": "Deeper", "children": [{"type": "toggle", "text": "Deepest", "children": [paragraph("bottom")]}]},
+        ]},
+        {"type": "column_list", "columns": [
+            {"type": "column", "children": [{"type": "to_do_list", "items": [{"text": str(index), "checked": False} for index in range(150)]}]},
+            {"type": "column", "children": [paragraph("right")]},
+        ]},
+        page("Sub", [paragraph("inside")]),
+        paragraph("last"),
+    ])
+    exported = export(server, materialize(server, blueprint))
+
+    top, items, toggle, columns, subpage, last = exported["children"]
+    assert texts([top, items, last]) == ["Top", [f"item {index}" for index in range(230)], "last"]
+    assert toggle["children"][0]["children"][0]["children"] == [paragraph("bottom")]
+    left, right = columns["columns"]
+    assert texts(left["children"]) == [[str(index) for index in range(150)]]
+    assert right["children"] == [paragraph("right")]
+    assert subpage["title"] == "Sub" and subpage["children"] == [paragraph("inside")]
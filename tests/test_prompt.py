@@ -0,0 +1,27 @@
+import json
+
+from blueprints import prompt
+
+
+def test_earlier_prompt_is_served_verbatim():
+    with open(prompt.training_data_path("v12"), encoding="utf-8") as file:
+        trained = {json.loads(line)["messages"][0]["content"] for line in file}
+
+    assert trained == {prompt.system_prompt("v12")}
+    assert prompt.system_prompt("v12") != prompt.system_prompt()
+
+
+def test_current_prompt_matches_its_training_data():
+    with open(prompt.training_data_path(), encoding="utf-8") as file:
+        trained = {json.loads(line)["messages"][0]["content"] for line in file}
+
+    assert trained == {prompt.system_prompt()}
+
+
+def test_fine_tuned_model_gets_the_prompt_it_was_trained_on(monkeypatch):
+    monkeypatch.setattr(prompt, "FINE_TUNED_MODEL", "ft:gpt-3.5-turbo-0125:personal:notiongpt:abc")
+    monkeypatch.setattr(prompt, "FINE_TUNED_PROMPT_VERSION", "v12")
+
+    messages = prompt.build_messages("I run a book club", version=prompt.prompt_version("ft:gpt-3.5-turbo-0125:personal:notiongpt:abc"))
+    assert messages[0]["content"] == prompt.system_prompt("v12")
+    assert prompt.prompt_version("gpt-4o") == prompt.PROMPT_VERSION
@@ -0,0 +1,66 @@
+from blueprints.repair import failing_subtrees, repair_child, repair_locally, validate
+
+from .helpers import paragraph
+
+
+def response(children):
+    return {"response": "Here you go.", "blueprint": {"type": "page", "title": "Plan", "children": children}}
+
+
+def test_repair_locally_fixes_mechanical_mistakes():
+    content = response([
+        {"type": "heading_4", "text": "Details"},
+        {"type": "toggle", "title": "More", "children": [{"type": "callout", "content": "Note", "color": "blue"}]},
+        {"type": "database", "title": "Tasks", "icon": "✅",
+         "schema": {"Name": "text", "Due": {"type": "datetime"}, "Tag": {"type": "select", "options": ["a", "b"]}}},
+    ])
+    fixed, error = repair_locally(content)
+
+    assert error is None
+    heading, toggle, database = fixed["blueprint"]["children"]
+    assert heading == {"type": "heading_3", "text": "Details"}
+    assert toggle["text"] == "More" and "title" not in toggle
+    assert toggle["children"] == [{"type": "callout", "content": [{"text": "Note"}], "color": "blue_background", "icon": "💡"}]
+    assert database["schema"] == {
+        "Name": {"type": "title"},
+        "Due": {"type": "date"},
+        "Tag": {"type": "select", "options": [{"name": "a", "color": "default"}, {"name": "b", "color": "default"}]},
+    }
+
+
+def test_repair_locally_leaves_the_input_alone():
+    content = response([{"type": "heading_4", "text": "Details"}, paragraph("Body")])
+    repair_locally(content)
+    assert content["blueprint"]["children"][0]["type"] == "heading_4"
+
+
+def test_repair_locally_unwraps_a_single_child():
+    content = response([{"type": "toggle", "text": "Everything", "children": [paragraph("One"), paragraph("Two")]}])
+    fixed, error = repair_locally(content)
+    assert error is None
+    assert fixed["blueprint"]["children"] == [{"type": "heading_2", "text": "Everything"}, paragraph("One"), paragraph("Two")]
+
+
+def test_repair_child():
+    fixed, error = repair_child({"type": "quote", "text": "Said"})
+    assert error is None
+    assert fixed == {"type": "quote", "content": [{"text": "Said"}]}
+
+
+def test_failing_subtrees_groups_by_outermost_block():
+    content = response([
+        {"type": "heading_1", "text": "Fine"},
+        {"type": "toggle", "text": "Box", "children": [{"type": "mystery"}, paragraph("Fine too")]},
+    ])
+    fixed, error = repair_locally(content)
+    assert error is not None
+
+    subtrees = failing_subtrees(fixed, error)
+    assert [path for path, _ in subtrees] == [("blueprint", "children", 1, "children", 0)]
+    assert "Toggle.text: Field required" in subtrees[0][1]
+
+
+def test_failing_subtrees_needs_a_regeneration_for_root_errors():
+    content = response([paragraph("Only one")])
+    content["blueprint"]["children"] = []
+    assert failing_subtrees(content, validate(content)) is None
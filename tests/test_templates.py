@@ -0,0 +1,33 @@
+import pytest
+
+from blueprints.templates import find_template
+
+
+@pytest.mark.parametrize("description", [
+    "track my reading list",
+    "keep track of my reading list",
+    "a reading list tracker",
+    "my research interests",
+    "habit of reading",
+    "a place to store my notes",
+    "a simple tracker",
+    "a budget for my wedding",
+])
+def test_near_misses_fall_through_to_generation(description):
+    assert find_template(description) is None
+
+
+@pytest.mark.parametrize("description, words", [
+    ("make me a monthly budget to monitor income and expenses", ["monthly budget"]),
+    ("track my monthly expenses and income", ["monthly budget"]),
+    ("write my research paper and keep track of sources", ["researcher"]),
+    ("build better habits and track them", ["habits"]),
+    ("a simple daily journal", ["daily journal"]),
+    ("personal CRM for my contacts", ["contact"]),
+    ("quickly jot down a note", ["jot down"]),
+    ("a startup data room to share with investors", ["Data Room"]),
+])
+def test_close_paraphrases_use_their_template(description, words):
+    template = find_template(description)
+    assert template is not None
+    assert all(word in template.prompt for word in words)
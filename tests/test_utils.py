@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+from blueprints import utils
+from blueprints.diskcache import DiskCache
+from blueprints.utils import Crawler, assemble, stream_page
+
+from .helpers import client, export, materialize, page, paragraph, texts
+
+LIST = "GET /v1/blocks/{id}/children"
+
+MIXED = page("Mixed", [
+    {"type": "heading_1", "text": "Top"},
+    {"type": "bulleted_list", "items": ["a", "b"]},
+    {"type": "numbered_list", "items": ["one", "two"]},
+    {"type": "to_do_list", "items": [{"text": "task", "checked": True}, {"text": "other", "checked": False}]},
+    {"type": "toggle", "text": "Folded", "children": [paragraph("inside"), {"type": "bulleted_list", "items": ["x"]}]},
+    {"type": "column_list", "columns": [
+        {"type": "column", "children": [paragraph("left")]},
+        {"type": "column", "children": [{"type": "quote", "content": [{"text": "right", "style": []}]}]},
+    ]},
+    page("Sub", [paragraph("nested"), page("Subsub", [paragraph("deepest")])]),
+    {"type": "database", "title": "Tasks", "icon": "✅", "schema": {
+        "Name": {"type": "title"},
+        "Status": {"type": "select", "options": [{"name": "Done", "color": "green"}]},
+    }},
+    paragraph("end"),
+])
+
+
+def crawl(server, page_id, max_concurrency=8, cache=None, details=True):
+    async def run():
+        async with client(server) as notion:
+            return await Crawler(notion, max_concurrency, cache=cache, icons=details, schemas=details).page(page_id)
+    return asyncio.run(run())
+
+
+def stream(server, page_id):
+    async def run():
+        async with client(server) as notion:
+            return [record async for record in stream_page(page_id, notion=notion)]
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("max_concurrency", [1, 8])
+def test_crawler_follows_every_cursor(server, max_concurrency):
+    page_id = materialize(server, page("Long", [
+        *(paragraph(str(index)) for index in range(230)),
+        {"type": "toggle", "text": "Long toggle", "children": [paragraph(f"inner {index}") for index in range(120)]},
+    ]))
+    server.reset_stats()
+    exported = crawl(server, page_id, max_concurrency)
+
+    assert texts(exported["children"]) == [str(index) for index in range(230)] + ["Long toggle"]
+    assert exported["children"][-1]["children"] == [paragraph(f"inner {index}") for index in range(120)]
+    # 231 blocks take three pages of 100 and the toggle's 120 children two more.
+    assert server.requests[LIST] == 5
+
+
+def test_crawler_reuses_unchanged_pages(server, tmp_path, monkeypatch):
+    # The fake server's times only move between exports here, so they need no margin for Notion's rounding.
+    monkeypatch.setattr(utils, "EDIT_TIME_RESOLUTION", 0)
+    cache = DiskCache(str(tmp_path / "exports.sqlite3"))
+    page_id = materialize(server, page("Cached", [paragraph("top"), page("Sub", [paragraph("inside")])]))
+    sub_id = export(server, page_id, include_ids=True)["children"][1]["id"]
+    # The first crawl sees the subpage in its parent's listing and the second retrieves it, both have to agree.
+    server.pages[sub_id]["last_edited_time"] = "2001-01-01T00:00:00.000Z"
+    first = crawl(server, page_id, cache=cache)
+
+    server.reset_stats()
+    assert crawl(server, page_id, cache=cache) == first
+    # Each page is only retrieved to check its time.
+    assert server.requests == {"GET /v1/pages/{id}": 2}
+
+    server.add_block(sub_id, {"type": "paragraph", "paragraph": {"rich_text": [{"type": "text", "text": {"content": "added"}}]}}, None)
+    server.pages[sub_id]["last_edited_time"] = "2002-01-01T00:00:00.000Z"
+    server.reset_stats()
+    exported = crawl(server, page_id, cache=cache)
+    assert texts(exported["children"][1]["children"]) == ["inside", "added"]
+    assert server.requests[LIST] == 1
+
+
+def test_crawler_exports_what_was_materialized(server):
+    page_id = materialize(server, MIXED)
+    server.reset_stats()
+    exported = crawl(server, page_id)
+    # Toggles are exported with their text as the title, which materializing accepts as well.
+    toggle = {"type": "toggle", "title": "Folded", "children": MIXED["children"][4]["children"]}
+    assert exported["title"] == "Mixed"
+    assert exported["children"] == MIXED["children"][:4] + [toggle] + MIXED["children"][5:]
+    # Blocks come from their listings alone, only pages and databases are retrieved, once each.
+    assert server.requests == {"GET /v1/pages/{id}": 3, "GET /v1/databases/{id}": 1, LIST: 7}
+
+
+def test_crawler_without_details_only_lists(server):
+    page_id = materialize(server, MIXED)
+    server.reset_stats()
+    exported = crawl(server, page_id, details=False)
+    assert texts(exported["children"][6:8]) == ["Sub", "Tasks"]
+    assert "schema" not in exported["children"][7]
+    assert server.requests == {"GET /v1/pages/{id}": 1, LIST: 7}
+
+
+@pytest.mark.parametrize("include_ids", [False, True])
+def test_assemble_matches_export(server, include_ids):
+    page_id = materialize(server, MIXED)
+    assert assemble(stream(server, page_id), include_ids) == export(server, page_id, include_ids)
+
+
+def test_stream_paths_are_in_document_order(server):
+    page_id = materialize(server, page("Paths", [
+        *(paragraph(str(index)) for index in range(120)),
+        {"type": "toggle", "text": "t", "children": [paragraph("a"), paragraph("b")]},
+        paragraph("end"),
+    ]))
+    paths = [record["path"] for record in stream(server, page_id)]
+    assert paths == ["", *(str(index) for index in range(121)), "120.0", "120.1", "121"]